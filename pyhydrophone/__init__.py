@@ -7,3 +7,5 @@ from pyhydrophone.rtsys import RTSys
 from pyhydrophone.ears import EARs
 from pyhydrophone.icListen import icListen
 from pyhydrophone.uaural import uAural
+from pyhydrophone.deployment import DeploymentIndex
+from pyhydrophone.telemetry import MissionTelemetry
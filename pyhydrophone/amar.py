@@ -6,6 +6,8 @@ from datetime import datetime
 
 
 class AmarG3(Hydrophone):
+    _name_datetime_regex = r'{}[^.]\.[^.]*$'
+
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format="%Y%m%dT%H%M%S",
                  calibration_file=None, **kwargs):
         """
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+import os
+import zipfile
+import threading
+import collections
+
+
+def split_zip_path(file_path):
+    """
+    Split the path of a file inside a zip in the path of the zip and the name of the file inside the zip
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path of the zip joined with the path of the file inside the zip (e.g. mission.zip/day1/file.wav)
+
+    Returns
+    -------
+    Path of the zip (str) and name of the file inside the zip (str)
+    """
+    file_path = str(file_path)
+    path_zip = file_path.split('.zip')[0] + '.zip'
+    file_zip = os.path.relpath(file_path, start=path_zip).replace('\\', '/')
+    return path_zip, file_zip
+
+
+class ArchiveCache:
+    """
+    Keep the zip files open to read many files inside them without reading the central directory of the zip each
+    time. At most max_open zip files are kept open: when more zip files are opened, the least recently used one is
+    closed. A zip file is opened again if it has been modified (different modification time or size) since it was
+    opened. It can be used from several threads
+
+    Parameters
+    ----------
+    max_open : int
+        Maximum number of zip files open at the same time
+    """
+    def __init__(self, max_open=8):
+        self.max_open = max_open
+        self._archives = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path_zip):
+        """
+        Return the open zip file
+
+        Parameters
+        ----------
+        path_zip : str or Path
+            Path to the zip file
+
+        Returns
+        -------
+        zipfile.ZipFile open for reading. It should not be closed by the caller
+        """
+        with self._lock:
+            return self._get(path_zip)
+
+    def _get(self, path_zip):
+        """
+        Same than get, to be called holding the lock
+        """
+        stat = os.stat(path_zip)
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = os.path.abspath(path_zip)
+        if key in self._archives:
+            archive_version, zip_file = self._archives[key]
+            if archive_version == version:
+                self._archives.move_to_end(key)
+                return zip_file
+            # The zip has been modified
+            del self._archives[key]
+            zip_file.close()
+        zip_file = zipfile.ZipFile(path_zip, 'r', allowZip64=True)
+        self._archives[key] = (version, zip_file)
+        while len(self._archives) > self.max_open:
+            _, (_, old_zip_file) = self._archives.popitem(last=False)
+            old_zip_file.close()
+        return zip_file
+
+    def open(self, file_path):
+        """
+        Open a file inside a zip
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Path of the zip joined with the path of the file inside the zip
+
+        Returns
+        -------
+        File object (to be closed by the caller). It can still be read if the zip file is closed afterwards
+        """
+        path_zip, file_zip = split_zip_path(file_path)
+        # The member is opened before another thread can close the zip file
+        with self._lock:
+            return self._get(path_zip).open(file_zip)
+
+    def read(self, file_path, size=-1):
+        """
+        Read the first size bytes of a file inside a zip (all the file if size is -1). Only these bytes are
+        decompressed
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Path of the zip joined with the path of the file inside the zip
+        size : int
+            Number of bytes to read
+
+        Returns
+        -------
+        bytes
+        """
+        with self.open(file_path) as f:
+            return f.read(size)
+
+    def close(self):
+        """
+        Close all the open zip files
+        """
+        with self._lock:
+            while self._archives:
+                _, (_, zip_file) = self._archives.popitem()
+                zip_file.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._archives)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Cache shared by all the readers of zipped files
+default_archive_cache = ArchiveCache()
@@ -36,6 +36,9 @@ class BruelKjaer(Hydrophone):
     calibration_file : string or Path
         File where the frequency dependent sensitivity values for the calibration are
     """
+    _name_datetime_regex = r'^{}(?:[_.]|$)'
+    _calibration_attributes = ['sensitivity', 'preamp_gain', 'amplif', 'Vpp', 'freq_cal']
+
     def __init__(self, name, model, serial_number, preamp_gain, Vpp=2.0, string_format="%y%m%d%H%M%S", type_signal='ref',
                  max_calibration_time=120.0, calibration_file=None, **kwargs):
         self.amplif = np.sqrt(10**(preamp_gain/10)) * 1e6
@@ -0,0 +1,230 @@
+#!/usr/bin/python
+import os
+import json
+import pathlib
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.signal as sig
+except ModuleNotFoundError:
+    pass
+
+
+CACHE_DIR_ENV = 'PYHYDROPHONE_CACHE_DIR'
+
+
+def read_freq_cal_file(calibration_file, sep=',', freq_col_id=0, val_col_id=1, start_data_id=0):
+    """
+    Parse a calibration file (csv, txt or xlsx) with frequency dependent values
+
+    Parameters
+    ----------
+    calibration_file : Path
+        File where the frequency dependent sensitivity values for the calibration are
+    sep : str
+        Separator between the different columns in csv or txt files
+    freq_col_id : int
+        Id of the frequency column in the file (starts with 0)
+    val_col_id : int
+        Id of the values column in the file (starts with 0)
+    start_data_id : int
+        Id of the first line with data (without title) in the file (starts with 0)
+
+    Returns
+    -------
+    np.array of shape (n, 2) with the two selected columns, in the order they have in the file
+    """
+    if calibration_file.suffix == '.csv' or calibration_file.suffix == '.txt':
+        df = pd.read_csv(calibration_file, sep=sep, header=None)
+    elif calibration_file.suffix == '.xlsx':
+        df = pd.read_excel(calibration_file, header=None)
+    else:
+        raise ValueError(f'Calibration file {calibration_file} has to be a .csv, .txt or .xlsx file')
+
+    df = df.iloc[:, (i for i in range(len(df.columns)) if i == freq_col_id or i == val_col_id)]
+    df = df[start_data_id:]
+    df = df.dropna(subset=[df.columns[0]])
+    df = df.replace('[A-Za-z:]', '', regex=True).astype(float)
+
+    return df.to_numpy(dtype=float)
+
+
+def read_freq_cal_file_cached(calibration_file, cache_dir, **parser_kwargs):
+    """
+    Same as read_freq_cal_file, but the parsed values are stored in an .npz file in cache_dir, so next time (also from
+    another process) the file does not need to be parsed again. The cache entry is identified by the path, the
+    modification time and size of the file and the parser arguments, so a modified calibration file is parsed again.
+    The entries are written to a temporary file and then renamed, so processes sharing the cache never read a partially
+    written entry
+
+    Parameters
+    ----------
+    calibration_file : Path
+        File where the frequency dependent sensitivity values for the calibration are
+    cache_dir : str or Path
+        Folder where to store the parsed calibration files
+    parser_kwargs :
+        sep, freq_col_id, val_col_id and start_data_id, passed to read_freq_cal_file
+
+    Returns
+    -------
+    np.array of shape (n, 2) with the two selected columns, in the order they have in the file
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    stat = os.stat(calibration_file)
+    key = json.dumps([str(pathlib.Path(calibration_file).resolve()), stat.st_mtime_ns, stat.st_size,
+                      sorted(parser_kwargs.items())])
+    cache_path = cache_dir.joinpath('freq_cal_%s.npz' % hashlib.sha1(key.encode()).hexdigest())
+    try:
+        with np.load(cache_path) as cached:
+            return cached['values']
+    except (OSError, KeyError, ValueError):
+        # Not cached yet (or unreadable entry)
+        pass
+
+    values = read_freq_cal_file(calibration_file, **parser_kwargs)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.npz.tmp', delete=False) as tmp_file:
+        np.savez(tmp_file, values=values)
+    os.replace(tmp_file.name, cache_path)
+
+    return values
+
+
+class FrequencyCalibration:
+    """
+    Frequency dependent calibration of a hydrophone compiled for one frequency grid.
+    It is created (and cached) by Hydrophone.compile_freq_cal, so the interpolation of the calibration curve is only
+    done once per frequency grid
+
+    Parameters
+    ----------
+    frequencies : 1d array
+        Frequencies where the calibration has been evaluated
+    inc : 1d array
+        Values in db to increment for each frequency, on top of the end to end calibration
+    """
+    def __init__(self, frequencies, inc):
+        self.frequencies = frequencies
+        self.inc = inc
+        # The compiled values are shared by all the users of the cache, they should not be modified
+        self.frequencies.setflags(write=False)
+        self.inc.setflags(write=False)
+        self._inc_per_dtype = {}
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def _get_inc(self, dtype, db=True):
+        """
+        Return the increment (db) or the gain (linear power) cast to dtype, computed only once per dtype
+        """
+        key = (np.dtype(dtype), db)
+        if key not in self._inc_per_dtype:
+            if db:
+                inc = self.inc.astype(dtype)
+            else:
+                inc = (10 ** (self.inc / 10.0)).astype(dtype)
+            inc.setflags(write=False)
+            self._inc_per_dtype[key] = inc
+        return self._inc_per_dtype[key]
+
+    def apply(self, spectra, db=True):
+        """
+        Apply the frequency dependent calibration IN PLACE to a spectrum or a matrix of spectra (time x frequency).
+        The last axis of spectra has to be the frequency axis used to compile the calibration.
+        It works with any writable float array, also with np.memmap, and does not make any copy of the data
+
+        Parameters
+        ----------
+        spectra : np.array
+            1d (frequency) or 2d (time x frequency) float array
+        db : bool
+            Set to True if the spectra are in db, to False if they are in linear power units
+
+        Returns
+        -------
+        The same spectra array, calibrated
+        """
+        if spectra.shape[-1] != len(self):
+            raise ValueError(f'The last axis of spectra has length {spectra.shape[-1]}, but the calibration was '
+                             f'compiled for {len(self)} frequencies')
+        if not np.issubdtype(spectra.dtype, np.floating):
+            raise ValueError(f'spectra must be a float array to be calibrated in place, not {spectra.dtype}')
+        if not spectra.flags.writeable:
+            raise ValueError('spectra is read-only and can not be calibrated in place')
+        inc = self._get_inc(spectra.dtype, db=db)
+        if db:
+            np.add(spectra, inc, out=spectra)
+        else:
+            np.multiply(spectra, inc, out=spectra)
+        return spectra
+
+
+class FreqCalFilter:
+    """
+    Streaming FIR filter applying the frequency dependent calibration to audio blocks in the time domain.
+    The filtering is done with overlap-add, and the tail of each block is carried to the next one, so consecutive
+    blocks of a stream can be filtered one by one. It is created by Hydrophone.freq_cal_filter, which caches the taps
+    per sampling rate. The filter has linear phase: the output is delayed by delay samples
+
+    Parameters
+    ----------
+    taps : 1d array
+        Coefficients of the FIR filter (odd length)
+    """
+    def __init__(self, taps):
+        self.taps = taps
+        self._tail = None
+
+    @property
+    def delay(self):
+        """
+        Delay of the filter in samples
+        """
+        return (len(self.taps) - 1) // 2
+
+    def reset(self):
+        """
+        Forget the state of the stream, to start filtering a new (not contiguous) stream
+        """
+        self._tail = None
+
+    def process(self, block):
+        """
+        Filter the next block of the stream
+
+        Parameters
+        ----------
+        block : np.array
+            Block of samples, shape (frames,) or (frames, channels)
+
+        Returns
+        -------
+        Filtered block with the same shape
+        """
+        taps = self.taps
+        if np.issubdtype(block.dtype, np.floating):
+            taps = taps.astype(block.dtype, copy=False)
+        if block.ndim > 1:
+            taps = taps[:, np.newaxis]
+        filtered = sig.oaconvolve(block, taps, mode='full', axes=0)
+        if self._tail is not None:
+            filtered[:len(self._tail)] += self._tail
+        self._tail = filtered[len(block):].copy()
+        return filtered[:len(block)]
+
+    def flush(self):
+        """
+        Return the remaining tail of the stream (len(taps) - 1 samples) and reset the filter
+
+        Returns
+        -------
+        np.array with the last filtered samples, or None if no block was processed
+        """
+        tail = self._tail
+        self.reset()
+        return tail
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+from pyhydrophone.utils import parallel_map, glob_files
+
+import os
+import json
+import datetime
+import pathlib
+import sqlite3
+import numpy as np
+import pandas as pd
+
+
+# Metadata of every sound file, stored in their own columns. The rest of the metadata of the hydrophone (see
+# Hydrophone.read_file_metadata) is stored as JSON in the metadata column
+SOUND_COLUMNS = ['duration', 'samplerate', 'channels', 'frames']
+
+
+def _to_json(value):
+    """
+    Convert the metadata values which are not JSON serializable (numpy scalars, datetimes). Datetimes are stored as
+    {"datetime": ISO string} to be converted back by _from_json
+    """
+    if isinstance(value, (datetime.datetime, np.datetime64)):
+        return {'datetime': pd.Timestamp(value).isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _from_json(obj):
+    """
+    Convert back the datetimes stored by _to_json
+    """
+    if obj.keys() == {'datetime'}:
+        return pd.Timestamp(obj['datetime'])
+    return obj
+
+
+class DeploymentIndex:
+    """
+    Index of all the sound files of a deployment, with the metadata of each file: start time (from the name of the
+    file), duration, sampling rate, number of channels and number of frames (from the header of the file), and the
+    specific metadata of the hydrophone (see Hydrophone.read_file_metadata).
+    The index is stored in a SQLite file, and refresh only reads again the files which are new or have been modified
+    (different modification time or size) since the last refresh
+
+    Parameters
+    ----------
+    hydrophone : Hydrophone object
+        Hydrophone used to record the deployment, to get the start time of each file from its name
+    folder_path : str or Path
+        Folder with all the files of the deployment
+    index_path : str or Path
+        SQLite file where to store the index. If None, the index is only kept in memory
+    pattern : str
+        Glob pattern of the sound files
+    include_dirs : bool
+        Set to True to also index the files in the subfolders
+    max_workers : int
+        Maximum number of headers read at the same time (in threads) during refresh
+    """
+    def __init__(self, hydrophone, folder_path, index_path=None, pattern='*.wav', include_dirs=False, max_workers=8):
+        self.hydrophone = hydrophone
+        self.folder_path = pathlib.Path(folder_path)
+        self.index_path = index_path
+        self.pattern = pattern
+        self.include_dirs = include_dirs
+        self.max_workers = max_workers
+        if index_path is None:
+            index_path = ':memory:'
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS files ('
+                                'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, start INTEGER, '
+                                'duration REAL, samplerate REAL, channels INTEGER, frames INTEGER, metadata TEXT)')
+        # Indexes created before the metadata column was added
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(files)')]
+        if 'metadata' not in columns:
+            self.connection.execute('ALTER TABLE files ADD COLUMN metadata TEXT')
+        self.connection.commit()
+
+    def close(self):
+        """
+        Close the connection to the index
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _list_files(self):
+        """
+        Return a dictionary with the relative path of all the files of the deployment and their (mtime, size)
+        """
+        files = {}
+        for file_path in glob_files(self.folder_path, self.pattern, self.include_dirs):
+            stat = os.stat(file_path)
+            files[file_path.relative_to(self.folder_path).as_posix()] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _read_file_header(self, relative_path):
+        """
+        Return the duration, sampling rate, number of channels and number of frames of the file and the rest of its
+        metadata as JSON (None if the file can not be read)
+        """
+        metadata = self.hydrophone._read_file_metadata_or_none(self.folder_path.joinpath(relative_path))
+        if metadata is None:
+            return None, None, None, None, None
+        extra = {key: value for key, value in metadata.items() if key not in SOUND_COLUMNS}
+        return (*[metadata.get(col) for col in SOUND_COLUMNS],
+                json.dumps(extra, default=_to_json) if len(extra) > 0 else None)
+
+    def refresh(self):
+        """
+        Update the index with the current files in the folder. Only the new and modified files are read, and the
+        files which are not in the folder anymore are removed from the index
+
+        Returns
+        -------
+        Number of files which have been (re)read
+        """
+        files = self._list_files()
+        indexed = {path: (mtime_ns, size) for path, mtime_ns, size in
+                   self.connection.execute('SELECT path, mtime_ns, size FROM files')}
+        removed = [(path,) for path in indexed.keys() if path not in files]
+        changed = [path for path, stat in files.items() if indexed.get(path) != stat]
+
+        # Start times in ns since epoch, None if they can not be read from the name
+        starts = self.hydrophone.get_name_datetimes(changed).astype(np.int64)
+        starts = [None if start == np.iinfo(np.int64).min else int(start) for start in starts]
+        rows = []
+        headers = parallel_map(self._read_file_header, changed, max_workers=self.max_workers)
+        for path, start, header in zip(changed, starts, headers):
+            rows.append((path, *files[path], start, *header))
+
+        with self.connection:
+            self.connection.executemany('DELETE FROM files WHERE path = ?', removed)
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+        return len(changed)
+
+    def _query(self, where='', params=()):
+        """
+        Select the files of the index matching the where clause, and return them as a DataFrame
+        """
+        df = pd.read_sql_query('SELECT path, start, duration, samplerate, channels, frames, metadata FROM files %s '
+                               'ORDER BY start, path' % where, self.connection, params=params)
+        df['file_path'] = [self.folder_path.joinpath(path) for path in df['path']]
+        df['start'] = pd.to_datetime(df['start'], unit='ns')
+        df['end'] = df['start'] + pd.to_timedelta(df['duration'], unit='s')
+        extra = [json.loads(metadata, object_hook=_from_json) if isinstance(metadata, str) else {}
+                 for metadata in df['metadata']]
+        extra = pd.DataFrame(extra, index=df.index)
+        return pd.concat([df[['file_path', 'start', 'end'] + SOUND_COLUMNS], extra], axis=1)
+
+    def to_dataframe(self):
+        """
+        Return the index as a DataFrame sorted by start time, with the columns file_path (absolute path), start
+        (datetime), end (datetime), duration (seconds), samplerate, channels and frames, followed by the specific
+        metadata of the hydrophone
+
+        Returns
+        -------
+        DataFrame with one row per file
+        """
+        return self._query()
+
+    def files_between(self, start, end):
+        """
+        Return the files which have data between start and end, sorted by start time
+
+        Parameters
+        ----------
+        start : datetime
+            Start of the period
+        end : datetime
+            End of the period
+
+        Returns
+        -------
+        DataFrame with the same columns than to_dataframe
+        """
+        return self._query('WHERE start < ? AND start + duration * 1e9 > ?',
+                           params=(pd.Timestamp(end).value, pd.Timestamp(start).value))
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
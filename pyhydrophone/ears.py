@@ -5,6 +5,8 @@ from datetime import datetime
 
 
 class EARs(Hydrophone):
+    _name_datetime_regex = r'^[^._]*_{}(?:\.|$)'
+
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format="%Y%m%d_%H%M%S",
                  calibration_file=None, **kwargs):
         """
@@ -1,15 +1,82 @@
 #!/usr/bin/python
+from pyhydrophone.utils import parallel_map, glob_files
+from pyhydrophone.calibration import FrequencyCalibration, FreqCalFilter, read_freq_cal_file, \
+    read_freq_cal_file_cached, CACHE_DIR_ENV
+
 from datetime import datetime
+import os
+import re
+import pathlib
+import functools
+import collections
 import numpy as np
 import soundfile as sf
 import pandas as pd
-import scipy.interpolate
 
 try:
     import scipy.signal as sig
 except ModuleNotFoundError:
     pass
 
+# Fields and number of digits of the strftime directives which can be parsed in a vectorized way
+DATETIME_DIRECTIVES = {
+    '%Y': ('year', 4),
+    '%y': ('short_year', 2),
+    '%m': ('month', 2),
+    '%d': ('day', 2),
+    '%H': ('hour', 2),
+    '%M': ('minute', 2),
+    '%S': ('second', 2),
+    '%f': ('microsecond', None),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def string_format_regex(string_format, name_regex='^{}$'):
+    """
+    Compile a regular expression to extract the datetime string from a file name, according to a strftime format
+
+    Parameters
+    ----------
+    string_format : str
+        Format of the datetime string (strftime directives)
+    name_regex : str
+        Regular expression of the whole file name, where {} is replaced by the datetime regular expression
+
+    Returns
+    -------
+    Compiled regular expression with one group (the datetime string), and a list of (field, position, n_digits) of
+    each directive in the datetime string, or None if the directives do not all have a fixed number of digits
+    """
+    datetime_regex = ''
+    fields = []
+    position = 0
+    tokens = [token for token in re.split('(%.)', string_format) if token != '']
+    for i, token in enumerate(tokens):
+        if token == '%%':
+            datetime_regex += '%'
+            position += 1
+        elif token.startswith('%') and len(token) == 2:
+            if token not in DATETIME_DIRECTIVES:
+                raise ValueError(f'Directive {token} of {string_format} can not be parsed in a vectorized way')
+            field, n_digits = DATETIME_DIRECTIVES[token]
+            if n_digits is None:
+                # Variable number of digits, only possible to read by position if it is the last directive
+                datetime_regex += '[0-9]{1,6}'
+                if i == len(tokens) - 1 and fields is not None:
+                    fields.append((field, position, 6))
+                else:
+                    fields = None
+            else:
+                datetime_regex += '[0-9]{%s}' % n_digits
+                if fields is not None:
+                    fields.append((field, position, n_digits))
+                position += n_digits
+        else:
+            datetime_regex += re.escape(token)
+            position += len(token)
+    return re.compile(name_regex.format('(%s)' % datetime_regex)), fields
+
 
 class Hydrophone:
     """
@@ -34,6 +101,13 @@ class Hydrophone:
     calibration_file : string or Path
         File where the frequency dependent sensitivity values for the calibration are
     """
+    # Attributes which invalidate the compiled frequency calibrations when changed
+    _calibration_attributes = ['sensitivity', 'preamp_gain', 'Vpp', 'freq_cal']
+    # Maximum number of frequency grids with a compiled frequency calibration kept in memory
+    freq_cal_cache_size = 16
+    # Regular expression of the file name used by get_name_datetimes, {} is replaced by the datetime string.
+    # Each subclass sets it to the naming convention of its files
+    _name_datetime_regex = '^{}$'
 
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format, calibration_file=None,
                  **kwargs):
@@ -60,6 +134,15 @@ class Hydrophone:
         if calibration_file is not None:
             self.get_freq_cal(**kwargs)
 
+    def __setattr__(self, name, value):
+        """
+        If any of the calibration parameters is changed, forget the compiled frequency calibrations
+        """
+        if name in self._calibration_attributes:
+            self.__dict__['_freq_cal_cache'] = collections.OrderedDict()
+            self.__dict__['_freq_cal_filters'] = {}
+        return super().__setattr__(name, value)
+
     def get_name_datetime(self, date_string):
         """
         Read the name of the file and according to the hydrophone protocol get the date
@@ -72,6 +155,61 @@ class Hydrophone:
         date = datetime.strptime(date_string, self.string_format)
         return date
 
+    def get_name_datetimes(self, file_names):
+        """
+        Vectorized version of get_name_datetime, to get the datetimes of a long list of files at once.
+        The file names can also be paths, only the name of the file is used
+
+        Parameters
+        ----------
+        file_names : list, np.array or pd.Series of strings or Paths
+            File names (or paths) of the files
+
+        Returns
+        -------
+        np.array of datetime64[ns], NaT for the names which do not match the string_format
+        """
+        names = [str(file_name).replace('\\', '/').rpartition('/')[2] for file_name in file_names]
+        if len(names) == 0:
+            return np.array([], dtype='datetime64[ns]')
+        try:
+            regex, fields = string_format_regex(self.string_format, self._name_datetime_regex)
+        except ValueError:
+            # Directives which can not be parsed in a vectorized way, parse the names one by one
+            dates = []
+            for name in names:
+                try:
+                    dates.append(self.get_name_datetime(name))
+                except (ValueError, IndexError):
+                    dates.append(None)
+            return pd.to_datetime(pd.Series(dates, dtype=object)).to_numpy(dtype='datetime64[ns]')
+
+        matches = [regex.search(name) for name in names]
+        date_strings = [match.group(1) if match is not None else '' for match in matches]
+        if fields is None:
+            # Variable number of digits (%f), let pandas parse the strings with the format
+            dates = pd.to_datetime(pd.Series(date_strings, dtype=object), format=self.string_format, errors='coerce')
+            return dates.to_numpy(dtype='datetime64[ns]')
+
+        # All the fields are at the same position in all the datetime strings: read the digits as a matrix
+        matched = np.array([match is not None for match in matches], dtype=bool)
+        width = max(max(map(len, date_strings)), max(position + n_digits for _, position, n_digits in fields))
+        date_bytes = np.array(date_strings, dtype='S%s' % width)
+        digits = date_bytes.view(np.uint8).reshape(len(date_bytes), -1).astype(np.int64) - ord('0')
+        # The missing digits at the end (only possible for %f) are zeros
+        digits[digits < 0] = 0
+        components = {'year': 1900, 'month': 1, 'day': 1, 'hour': 0, 'minute': 0, 'second': 0}
+        for field, position, n_digits in fields:
+            value = digits[:, position:position + n_digits] @ (10 ** np.arange(n_digits - 1, -1, -1))
+            if field == 'short_year':
+                # Same convention than strptime: 69-99 are 1969-1999 and 0-68 are 2000-2068
+                field = 'year'
+                value = value + np.where(value >= 69, 1900, 2000)
+            components[field] = np.where(matched, value, np.nan)
+        components = {field: np.broadcast_to(value, len(names)) for field, value in components.items()}
+        dates = pd.to_datetime(pd.DataFrame(components), errors='coerce')
+        return dates.to_numpy(dtype='datetime64[ns]')
+
     def get_new_name(self, filename, new_date):
         """
         Replace the datetime with the appropriate one
@@ -116,6 +254,12 @@ class Hydrophone:
         Updates the parameter preamp_gain
         """
         ref_wav = np.sqrt((calibration_signal ** 2).mean())
+        self._update_calibration_rms(ref_wav, p_ref=p_ref)
+
+    def _update_calibration_rms(self, ref_wav, p_ref=1.0):
+        """
+        Updates the parameter preamp_gain from the rms value of the calibration signal
+        """
         mv = 10 ** (self.sensitivity / 20.0) * p_ref
         ma = 10 ** (self.preamp_gain / 20.0) * p_ref
         gain_upa = (self.Vpp / 2.0) / (mv * ma)
@@ -123,25 +267,65 @@ class Hydrophone:
         correction_factor = real_db - self.cal_value
         self.preamp_gain += correction_factor
 
-    def calibrate(self, file_path):
+    def calibrate(self, file_path, start=None, end=None, detect_tone=False, tone_threshold=0.05, blocksize=None):
         """
         Find the beginning and ending sample of the calibration tone
         Returns start and end points, in seconds
+        The file is read by blocks and only the sum of squares is accumulated, so the memory used does not depend on the
+        duration of the calibration recording.
 
         Parameters
         ----------
         file_path : string or Path
             File where to look for the calibration (at the beginning of the file)
+        start : float
+            Second of the file where the calibration starts. If None, from the beginning of the file
+        end : float
+            Second of the file where the calibration ends. If None, until the end of the file
+        detect_tone : bool
+            Set to True to use only the longest part of the signal (between start and end) where the rms of the blocks
+            is above tone_threshold
+        tone_threshold : float
+            Minimum rms (in the digital scale, from 0 to 1) of a block to be considered part of the calibration tone
+        blocksize : int
+            Number of frames per block. It is also the resolution of the tone detection. If None, 0.1 s is used
 
         Returns
         -------
-        end sample of the calibration (int)
+        end sample of the calibration (int), or None if no calibration tone was detected
         """
-        wav_file = sf.SoundFile(file_path)
-        calibration_signal = wav_file.read()
-        self.update_calibration(calibration_signal)
-
-        return None
+        with sf.SoundFile(file_path, 'r') as wav_file:
+            start_frame = 0 if start is None else int(start * wav_file.samplerate)
+            end_frame = wav_file.frames if end is None else min(int(end * wav_file.samplerate), wav_file.frames)
+            if blocksize is None:
+                blocksize = int(0.1 * wav_file.samplerate)
+            buffer = np.empty((blocksize, wav_file.channels))
+            wav_file.seek(start_frame)
+
+            # Sum of squares and number of samples of the current and of the longest selected part
+            position = start_frame
+            run_sum, run_n = 0.0, 0
+            best_end, best_sum, best_n = None, 0.0, 0
+            while position < end_frame:
+                block = wav_file.read(out=buffer[:min(blocksize, end_frame - position)]).ravel()
+                if len(block) == 0:
+                    break
+                block_frames = len(block) // wav_file.channels
+                block_sum = np.dot(block, block)
+                if not detect_tone or np.sqrt(block_sum / len(block)) >= tone_threshold:
+                    run_sum += block_sum
+                    run_n += len(block)
+                else:
+                    run_sum, run_n = 0.0, 0
+                position += block_frames
+                if run_n > best_n:
+                    best_end, best_sum, best_n = position, run_sum, run_n
+
+        if best_n == 0:
+            return None
+        self._update_calibration_rms(np.sqrt(best_sum / best_n))
+
+        return best_end
 
     def end_to_end_calibration(self, p_ref=1.0):
         """
@@ -160,9 +344,226 @@ class Hydrophone:
         gain_upa = (self.Vpp / 2.0) / (mv * ma)
         return 10 * np.log10(gain_upa ** 2)
 
-    def get_freq_cal(self, val='sensitivity', sep=',', freq_col_id=0, val_col_id=1, start_data_id=0):
+    def read_calibrated_blocks(self, file_path, blocksize=65536, start=0, stop=None, dtype='float64', p_ref=1.0,
+                               freq_cal=False):
         """
-        Compute a dataframe with all the frequency dependent sensitivity values from the calibration file
+        Read a sound file block by block and yield each block already converted to uPa, using the end to end
+        calibration. Only one block is kept in memory: the same output buffer is reused for all the blocks, so copy
+        the yielded array if it has to be kept after the next iteration.
+        If freq_cal is True, the frequency dependent calibration is also applied with the filter from freq_cal_filter.
+        The delay of the filter is compensated, but the blocks do not have exactly blocksize frames anymore
+
+        Parameters
+        ----------
+        file_path : string or Path
+            Sound file to read
+        blocksize : int
+            Number of frames per block
+        start : int
+            First frame to read
+        stop : int
+            Frame where to stop reading (not included). If None, the file is read until the end
+        dtype : str
+            'float64' or 'float32', type of the output blocks
+        p_ref : float
+            Reference pressure to compute db from
+        freq_cal : bool
+            Set to True to apply also the frequency dependent calibration
+
+        Returns
+        -------
+        Generator of np.array blocks in uPa, shape (frames,) for mono files or (frames, channels) otherwise
+        """
+        if dtype not in ['float64', 'float32']:
+            raise ValueError(f'dtype {dtype} is not implemented. Only float64 or float32 are valid values')
+        gain_upa = 10 ** (self.end_to_end_calibration(p_ref=p_ref) / 20.0)
+        with sf.SoundFile(file_path, 'r') as wav_file:
+            if stop is None or stop > wav_file.frames:
+                stop = wav_file.frames
+            if wav_file.channels == 1:
+                buffer = np.empty(blocksize, dtype=dtype)
+            else:
+                buffer = np.empty((blocksize, wav_file.channels), dtype=dtype)
+            if freq_cal:
+                fir = self.freq_cal_filter(wav_file.samplerate, p_ref=p_ref)
+                # Samples to skip at the beginning to compensate the delay of the filter
+                to_skip = fir.delay
+            wav_file.seek(start)
+            frames_left = stop - start
+            while frames_left > 0:
+                block = wav_file.read(out=buffer[:min(blocksize, frames_left)])
+                if len(block) == 0:
+                    break
+                block *= gain_upa
+                frames_left -= len(block)
+                if freq_cal:
+                    block = fir.process(block)
+                    skipped = min(to_skip, len(block))
+                    to_skip -= skipped
+                    block = block[skipped:]
+                    if len(block) == 0:
+                        continue
+                yield block
+            if freq_cal:
+                tail = fir.flush()
+                if tail is not None and fir.delay > to_skip:
+                    yield tail[to_skip:fir.delay]
+
+    def read_file_metadata(self, file_path):
+        """
+        Read the metadata of one sound file from its header
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Sound file to read the metadata from
+
+        Returns
+        -------
+        Dictionary with the duration, samplerate, channels and frames of the file
+        """
+        info = sf.info(file_path)
+        return {'duration': info.duration, 'samplerate': info.samplerate, 'channels': info.channels,
+                'frames': info.frames}
+
+    def _read_file_metadata_or_none(self, file_path):
+        """
+        Same than read_file_metadata but returns None if the file can not be read
+        """
+        try:
+            return self.read_file_metadata(file_path)
+        except (RuntimeError, OSError) as e:
+            print(f'{file_path} has some problem and can not be read: {e}')
+            return None
+
+    def scan_metadata(self, folder_path, pattern='*.wav', include_dirs=False, max_workers=8):
+        """
+        Read the metadata of all the files of a folder (see read_file_metadata) with a pool of threads, because opening
+        the headers is mostly waiting for the disk (specially on network storage). Files which can not be read are
+        reported and left out
+
+        Parameters
+        ----------
+        folder_path : str or Path
+            Folder with all the files of the deployment
+        pattern : str
+            Glob pattern of the sound files
+        include_dirs : bool
+            Set to True to also scan the files in the subfolders
+        max_workers : int
+            Maximum number of files opened at the same time
+
+        Returns
+        -------
+        DataFrame with one row per file (sorted by start time) with the columns file_path, start (from the name of the
+        file) and all the metadata
+        """
+        file_paths = glob_files(folder_path, pattern, include_dirs)
+        rows = []
+        for file_path, metadata in zip(file_paths, parallel_map(self._read_file_metadata_or_none, file_paths,
+                                                                max_workers=max_workers)):
+            if metadata is not None:
+                rows.append({'file_path': file_path, **metadata})
+        df = pd.DataFrame(rows, columns=['file_path'] + (list(rows[0].keys())[1:] if rows else []))
+        df.insert(1, 'start', self.get_name_datetimes(df['file_path']))
+
+        return df.sort_values(['start', 'file_path'], ignore_index=True)
+
+    def _files_in_range(self, folder_path, start, end, index=None, pattern='*.wav', include_dirs=False):
+        """
+        Return a list of (file_path, start_frame, stop_frame) with the part of each file between start and end.
+        Only the headers of the files which can overlap the period (according to the start time in their name) are read
+        """
+        if index is not None:
+            files = index.files_between(start, end)
+            candidates = zip(files['file_path'], files['start'], files['samplerate'], files['frames'])
+        else:
+            file_paths = glob_files(folder_path, pattern, include_dirs)
+            starts = self.get_name_datetimes([file_path.name for file_path in file_paths])
+            for i in np.where(np.isnat(starts))[0]:
+                print(f'Start time of {file_paths[i]} can not be read from its name, it will be ignored')
+            valid = np.where(~np.isnat(starts))[0]
+            valid = valid[np.argsort(starts[valid], kind='stable')]
+            # Files starting before the end of the period, from the last one starting before the start of the period
+            first = max(np.searchsorted(starts[valid], np.datetime64(start, 'ns'), side='right') - 1, 0)
+            last = np.searchsorted(starts[valid], np.datetime64(end, 'ns'), side='left')
+            candidates = []
+            for i in valid[first:last]:
+                info = sf.info(file_paths[i])
+                candidates.append((file_paths[i], pd.Timestamp(starts[i]), info.samplerate, info.frames))
+
+        files_in_range = []
+        for file_path, file_start, samplerate, frames in candidates:
+            start_frame = max(0, int(round((start - file_start).total_seconds() * samplerate)))
+            stop_frame = min(frames, int(round((end - file_start).total_seconds() * samplerate)))
+            if stop_frame > start_frame:
+                files_in_range.append((file_path, start_frame, stop_frame))
+
+        return files_in_range
+
+    def read_range(self, folder_path, start, end, blocksize=None, index=None, pattern='*.wav', include_dirs=False,
+                   dtype='float64', p_ref=1.0):
+        """
+        Read the calibrated signal (in uPa) between start and end from a deployment, even if the period is split in
+        several files. Only the files overlapping the period are opened, and they are read from the right frame.
+        The start time of each file is read from its name. Gaps between files are not filled.
+
+        Parameters
+        ----------
+        folder_path : str or Path
+            Folder with all the files of the deployment
+        start : datetime
+            Start of the period to read
+        end : datetime
+            End of the period to read
+        blocksize : int
+            If None, all the period is returned in one array. Otherwise, a generator of blocks of maximum blocksize
+            frames is returned (blocks do not cross the boundaries of the files). The generator reuses the buffers
+            of read_calibrated_blocks
+        index : DeploymentIndex
+            Index of the deployment. If given, it is used to find the files instead of listing the folder
+        pattern : str
+            Glob pattern of the sound files
+        include_dirs : bool
+            Set to True to also look for the files in the subfolders
+        dtype : str
+            'float64' or 'float32', type of the output
+        p_ref : float
+            Reference pressure to compute db from
+
+        Returns
+        -------
+        np.array in uPa, shape (frames,) or (frames, channels), or a generator of blocks if blocksize is not None
+        """
+        files_in_range = self._files_in_range(folder_path, start, end, index=index, pattern=pattern,
+                                              include_dirs=include_dirs)
+        if blocksize is not None:
+            return (block for file_path, start_frame, stop_frame in files_in_range
+                    for block in self.read_calibrated_blocks(file_path, blocksize=blocksize, start=start_frame,
+                                                             stop=stop_frame, dtype=dtype, p_ref=p_ref))
+
+        if dtype not in ['float64', 'float32']:
+            raise ValueError(f'dtype {dtype} is not implemented. Only float64 or float32 are valid values')
+        total_frames = sum(stop_frame - start_frame for _, start_frame, stop_frame in files_in_range)
+        if len(files_in_range) == 0 or sf.info(files_in_range[0][0]).channels == 1:
+            signal = np.empty(total_frames, dtype=dtype)
+        else:
+            signal = np.empty((total_frames, sf.info(files_in_range[0][0]).channels), dtype=dtype)
+        position = 0
+        for file_path, start_frame, stop_frame in files_in_range:
+            with sf.SoundFile(file_path, 'r') as wav_file:
+                wav_file.seek(start_frame)
+                position += len(wav_file.read(out=signal[position:position + stop_frame - start_frame]))
+        signal = signal[:position]
+        signal *= 10 ** (self.end_to_end_calibration(p_ref=p_ref) / 20.0)
+
+        return signal
+
+    def get_freq_cal(self, val='sensitivity', sep=',', freq_col_id=0, val_col_id=1, start_data_id=0, cache_dir=None):
+        """
+        Compute a dataframe with all the frequency dependent sensitivity values from the calibration file.
+        If cache_dir is given (or the environment variable PYHYDROPHONE_CACHE_DIR is set), the parsed values are cached
+        on disk, and the file is only parsed again if it has been modified
 
         Parameters
         ----------
@@ -176,27 +577,25 @@ class Hydrophone:
             Id of the values column in the file (starts with 0)
         start_data_id : int
             Id of the first line with data (without title) in the file (starts with 0)
+        cache_dir : str or Path
+            Folder where to cache the parsed calibration files. If None, PYHYDROPHONE_CACHE_DIR is used if it is set
         """
+        calibration_file = pathlib.Path(self.calibration_file)
+        if cache_dir is None:
+            cache_dir = os.environ.get(CACHE_DIR_ENV)
+        parser_kwargs = dict(sep=sep, freq_col_id=freq_col_id, val_col_id=val_col_id, start_data_id=start_data_id)
+        if cache_dir:
+            values = read_freq_cal_file_cached(calibration_file, cache_dir, **parser_kwargs)
+        else:
+            values = read_freq_cal_file(calibration_file, **parser_kwargs)
 
-        if self.calibration_file.suffix == '.csv' or self.calibration_file.suffix == '.txt':
-            df = pd.read_csv(self.calibration_file, sep=sep, header=None)
-
-        elif self.calibration_file.suffix == '.xlsx':
-            df = pd.read_excel(self.calibration_file, header=None)
-
-        df = df.iloc[:, (i for i in range(len(df.columns)) if i == freq_col_id or i == val_col_id)]
-        df = df[start_data_id:]
-        df = df.dropna(subset=[df.columns[0]])
-        df = df.replace('[A-Za-z:]', '', regex=True).astype(float)
-        df = df.reset_index(drop=True)
-        df.columns = ['frequency', val]
-
-        self.freq_cal = df
+        self.freq_cal = pd.DataFrame(values, columns=['frequency', val])
 
-    def freq_cal_inc(self, frequencies, p_ref=1.0):
+    def compile_freq_cal(self, frequencies, p_ref=1.0):
         """
-        Returns a dataframe with the frequency dependent values to increment from the selected frequencies you give from
-        the data you want to increment
+        Compile the frequency dependent calibration for the selected frequencies. The result is cached per frequency
+        grid (only the last freq_cal_cache_size grids are kept), and the cache is emptied when sensitivity,
+        preamp_gain, Vpp or freq_cal are changed. Modifying freq_cal in place is not detected.
 
         Parameters
         ----------
@@ -207,20 +606,20 @@ class Hydrophone:
 
         Returns
         -------
-        df_freq_inc : pandas Dataframe
-            Frequency dependent values to increment in your data
+        FrequencyCalibration object with the (read-only) frequency dependent values to increment in your data
         """
+        frequencies = np.asarray(frequencies, dtype=float)
+        key = (p_ref, frequencies.shape, hash(frequencies.tobytes()))
+        cache = self.__dict__.setdefault('_freq_cal_cache', collections.OrderedDict())
+        if key in cache and np.array_equal(cache[key].frequencies, frequencies):
+            cache.move_to_end(key)
+            return cache[key]
+
         df = self.freq_cal
         val = df.columns[1]
-        min_freq = df['frequency'][0]
-        max_freq = df['frequency'][df.shape[0] - 1]
-        interpol = scipy.interpolate.interp1d(df['frequency'], df[val], kind='linear')
-
-        frequencies_below = frequencies.compress(frequencies < min_freq)
-        frequencies_between = frequencies.compress(np.logical_and(frequencies >= min_freq, frequencies <= max_freq))
-        frequencies_above = frequencies.compress(frequencies > max_freq)
-
-        freq_dep_cal = interpol(frequencies_between)
+        cal_frequencies = df['frequency'].to_numpy(dtype=float)
+        cal_values = df[val].to_numpy(dtype=float)
+        freq_dep_cal = np.interp(frequencies, cal_frequencies, cal_values)
 
         if val == 'sensitivity':
             mv = 10 ** (freq_dep_cal / 20.0) * p_ref
@@ -231,8 +630,95 @@ class Hydrophone:
             freq_cal_inc = freq_dep_cal - self.end_to_end_calibration()
         else:
             raise ValueError(f'columns name {val} is not implemented. Only end_to_end or sensitivity are valid values')
-        freq_cal_inc = np.concatenate(
-            (np.zeros(frequencies_below.shape), freq_cal_inc, np.zeros(frequencies_above.shape)))
-        df_freq_inc = pd.DataFrame(data=np.vstack((frequencies, freq_cal_inc)).T, columns=['frequency', 'inc_value'])
+        # Outside the calibrated range the frequency dependent increment is 0
+        inside = np.logical_and(frequencies >= cal_frequencies[0], frequencies <= cal_frequencies[-1])
+        freq_cal_inc = np.where(inside, freq_cal_inc, 0.0)
+
+        compiled = FrequencyCalibration(frequencies.copy(), freq_cal_inc)
+        cache[key] = compiled
+        while len(cache) > self.freq_cal_cache_size:
+            cache.popitem(last=False)
+        return compiled
+
+    def freq_cal_filter(self, fs, numtaps=1025, p_ref=1.0):
+        """
+        Design a linear phase FIR filter with the frequency response of the frequency dependent calibration (on top of
+        the end to end calibration), to calibrate audio in the time domain. The taps are cached per sampling rate until
+        sensitivity, preamp_gain, Vpp or freq_cal are changed. Each call returns a new streaming filter, so several
+        streams can be filtered at the same time
+
+        Parameters
+        ----------
+        fs : int
+            Sampling rate of the audio to filter
+        numtaps : int
+            Length of the filter. Has to be odd, if it is even one more tap is added
+        p_ref: float
+            Reference pressure to compute db from
+
+        Returns
+        -------
+        FreqCalFilter object
+        """
+        if numtaps % 2 == 0:
+            numtaps += 1
+        key = (fs, numtaps, p_ref)
+        filters = self.__dict__.setdefault('_freq_cal_filters', {})
+        if key not in filters:
+            nfreqs = 1 + 2 ** int(np.ceil(np.log2(numtaps)))
+            frequencies = np.linspace(0, fs / 2, nfreqs)
+            gain = 10 ** (self.compile_freq_cal(frequencies, p_ref=p_ref).inc / 20.0)
+            taps = sig.firwin2(numtaps, frequencies, gain, fs=fs)
+            taps.setflags(write=False)
+            filters[key] = taps
+
+        return FreqCalFilter(filters[key])
+
+    def freq_cal_inc(self, frequencies, p_ref=1.0, as_array=False):
+        """
+        Returns a dataframe with the frequency dependent values to increment from the selected frequencies you give from
+        the data you want to increment
+
+        Parameters
+        ----------
+        frequencies : 1d array
+            Frequencies from the data you want to increment with frequency dependent calibration
+        p_ref: float
+            Reference pressure to compute db from
+        as_array : bool
+            Set to True to get only the (read-only) numpy array of values to increment, without building a DataFrame
+
+        Returns
+        -------
+        df_freq_inc : pandas Dataframe
+            Frequency dependent values to increment in your data
+        """
+        compiled = self.compile_freq_cal(frequencies, p_ref=p_ref)
+        if as_array:
+            return compiled.inc
+        df_freq_inc = pd.DataFrame({'frequency': compiled.frequencies, 'inc_value': compiled.inc})
 
         return df_freq_inc
+
+    def apply_freq_cal(self, spectra, frequencies, db=True, p_ref=1.0):
+        """
+        Apply the frequency dependent calibration IN PLACE to a matrix of spectra (time x frequency), for example a
+        spectrogram or long-term spectral averages. Works with float32, float64 and memory-mapped arrays
+        (np.memmap opened in 'r+' mode), without copying the data
+
+        Parameters
+        ----------
+        spectra : np.array
+            1d (frequency) or 2d (time x frequency) float array
+        frequencies : 1d array
+            Frequencies of the last axis of spectra
+        db : bool
+            Set to True if the spectra are in db, to False if they are in linear power units
+        p_ref: float
+            Reference pressure to compute db from
+
+        Returns
+        -------
+        The same spectra array, calibrated
+        """
+        return self.compile_freq_cal(frequencies, p_ref=p_ref).apply(spectra, db=db)
@@ -27,6 +27,8 @@ class MTE(Hydrophone):
     calibration_file : string or Path
         File where the frequency dependent sensitivity values for the calibration are
     """
+    _name_datetime_regex = r'^[^._]*_{}(?:[_.]|$)'
+
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format="%y%m%d_%H%M%S",
                  calibration_file=None, **kwargs):
         super().__init__(name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format, calibration_file,
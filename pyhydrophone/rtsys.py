@@ -1,12 +1,14 @@
 #!/usr/bin/python
 from pyhydrophone.hydrophone import Hydrophone
+from pyhydrophone.archive import default_archive_cache
+from pyhydrophone.telemetry import MissionTelemetry
 
 from datetime import datetime
-import struct
 import numpy as np
 import zipfile
-import os
-import pathlib
+import tempfile
+import contextlib
+import io
 
 try:
     import matplotlib.pyplot as plt
@@ -15,6 +17,44 @@ except ModuleNotFoundError:
     pass
 
 
+# The RTSys configuration starts at byte 36 of the wav file. All the fields are in its first 104 bytes
+HEADER_START = 36
+HEADER_SIZE = 104
+# Fields of the configuration (name, numpy format, offset in the configuration). The channel is the last byte of the
+# epoch time. The fields with a uint8 array are decoded as strings (with all their bytes, also the \x00)
+HEADER_FIELDS = [
+    ('conf', ('u1', 4), 0),
+    ('conf_size', '<u4', 4),
+    ('conf_version', '<u4', 8),
+    ('epoch_time_recording', '<f8', 16),
+    ('channel', ('u1', 1), 23),
+    ('sr', '<f4', 28),
+    ('hydrophone_sensitivity_A', '<f4', 32),
+    ('hydrophone_sensitivity_B', '<f4', 36),
+    ('hydrophone_sensitivity_C', '<f4', 40),
+    ('hydrophone_sensitivity_D', '<f4', 44),
+    ('hydrophone_amplification_A', '<f4', 48),
+    ('hydrophone_amplification_B', '<f4', 52),
+    ('hydrophone_amplification_C', '<f4', 56),
+    ('hydrophone_amplification_D', '<f4', 60),
+    ('correction_factor_A', '<f4', 64),
+    ('correction_factor_B', '<f4', 68),
+    ('correction_factor_C', '<f4', 72),
+    ('correction_factor_D', '<f4', 76),
+    ('serial_number', ('u1', 16), 80),
+    ('active_channels', ('u1', 4), 100),
+]
+# Structured dtype of the beginning of the file, with the configuration (decodes many headers at once)
+HEADER_DTYPE = np.dtype({'names': [name for name, _, _ in HEADER_FIELDS],
+                         'formats': [field_format for _, field_format, _ in HEADER_FIELDS],
+                         'offsets': [HEADER_START + offset for _, _, offset in HEADER_FIELDS],
+                         'itemsize': HEADER_START + HEADER_SIZE})
+
+# Translation table deleting the prefixes of the values in the board files (e.g. @:001633957870.378542;T:+42.9;)
+BOARD_PREFIX_TABLE = str.maketrans('', '', '@TVIP:')
+BOARD_DTYPES = {'id': np.float64, 'T': np.float32, 'V': np.float32, 'I': np.float32, 'P': np.float32}
+
+
 class RTSys(Hydrophone):
     """
     Init an instance of RTSys
@@ -42,6 +82,7 @@ class RTSys(Hydrophone):
     calibration_file : string or Path
         File where the frequency dependent sensitivity values for the calibration are
     """
+    _name_datetime_regex = r'^[^._]*_{}(?:\.|$)'
 
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, mode, channel='A',
                  string_format="%Y-%m-%d_%H-%M-%S", calibration_file=None):
@@ -87,21 +128,25 @@ class RTSys(Hydrophone):
 
     @staticmethod
     def _parse_board_file(board_file_path):
-        board_info = pd.read_csv(board_file_path, delimiter=';', names=['id', 'T', 'V', 'I', 'P'],
-                                 usecols=[0, 1, 2, 3, 4])
-        board_info['T'] = board_info['T'].str.replace('T:', '')
-        board_info.loc[board_info['T'] == ''] = np.nan
-        board_info['T'] = board_info['T'].astype(float)
-        board_info['V'] = board_info['V'].str.replace('V:', '')
-        board_info.loc[board_info['V'] == ''] = np.nan
-        board_info['V'] = board_info['V'].astype(float)
-        board_info['I'] = board_info['I'].str.replace('I:', '')
-        board_info.loc[board_info['I'] == ''] = np.nan
-        board_info['I'] = board_info['I'].astype(float)
-        board_info['P'] = board_info['P'].str.replace('P:', '')
-        board_info.loc[board_info['P'] == ''] = np.nan
-        board_info['P'] = board_info['P'].astype(float)
-        board_info['timestamp'] = pd.to_datetime(board_info['id'].str.replace('@:', '').astype(float), unit='s')
+        """
+        Parse a board file. The prefixes of the values are removed from all the text at once, so all the columns
+        are directly parsed as numbers. The rows with any empty measurement are set to NaN
+
+        Parameters
+        ----------
+        board_file_path : str or Path
+
+        Returns
+        -------
+        DataFrame with the columns id (epoch time in s), T (degrees C), V (V), I (A), P (W) as float32, timestamp and
+        dP (energy consumed since the previous row, in J)
+        """
+        with open(board_file_path, 'r') as f:
+            board_text = f.read().translate(BOARD_PREFIX_TABLE)
+        board_info = pd.read_csv(io.StringIO(board_text), delimiter=';', names=list(BOARD_DTYPES.keys()),
+                                 usecols=[0, 1, 2, 3, 4], dtype=BOARD_DTYPES, engine='c')
+        board_info.loc[board_info[['T', 'V', 'I', 'P']].isna().any(axis=1)] = np.nan
+        board_info['timestamp'] = pd.to_datetime(board_info['id'], unit='s')
         board_info['dP'] = board_info['timestamp'].diff().dt.total_seconds() * board_info['P']
 
         return board_info
@@ -118,15 +163,63 @@ class RTSys(Hydrophone):
         board_info.plot(y=['V', 'P'])
         plt.show()
 
-    def plot_consumption_total_mission(self, mission_folder_path, ax=None, show=True):
-        if not isinstance(mission_folder_path, pathlib.Path):
-            mission_folder_path = pathlib.Path(mission_folder_path)
+    def mission_telemetry(self, mission_folder_path, cache_dir=None, max_workers=1, keep_series=True):
+        """
+        Return the telemetry store of the mission, refreshed with the current board files (see MissionTelemetry).
+        With a cache_dir, only the board files which changed since the last call are parsed
 
-        total_board = pd.DataFrame()
-        for board_file_i in mission_folder_path.glob('**/*.txt'):
-            if 'board' in board_file_i.name:
-                board_i = self._parse_board_file(board_file_i)
-                total_board = pd.concat([total_board, board_i])
+        Parameters
+        ----------
+        mission_folder_path : str or Path
+        cache_dir : str or Path
+            Folder where to cache the parsed board files. If None, all the files are parsed
+        max_workers : int
+            Maximum number of board files parsed at the same time, in processes. If 1 (default), they are parsed in
+            the current process. Higher values need the calling script to be protected by if __name__ == '__main__'
+            when processes are spawned (default on Windows and macOS)
+        keep_series : bool
+            If False, only the totals of each board file are kept, not their series (see MissionTelemetry)
+
+        Returns
+        -------
+        MissionTelemetry object (to be closed by the caller)
+        """
+        telemetry = MissionTelemetry(self, mission_folder_path, cache_dir=cache_dir, max_workers=max_workers,
+                                     keep_series=keep_series)
+        telemetry.refresh()
+        return telemetry
+
+    def plot_consumption_total_mission(self, mission_folder_path, ax=None, show=True, cache_dir=None,
+                                       max_workers=1, max_points=4000):
+        """
+        Plot the consumption evolution of all the board files of the mission
+
+        Parameters
+        ----------
+        mission_folder_path : str or Path
+        ax : matplotlib axes
+            Axes where to plot. If None, a new figure is created
+        show : bool
+            Set to True to show the plot
+        cache_dir : str or Path
+            Folder where to cache the parsed board files (see mission_telemetry). If None and max_points is set, the
+            series are cached in a temporary folder while plotting, so they are decimated one file at a time
+        max_workers : int
+            Maximum number of board files parsed at the same time (see mission_telemetry)
+        max_points : int
+            Maximum number of points plotted. The series are reduced to their minimum and maximum per time bin (see
+            MissionTelemetry.decimate). If None, all the points are plotted
+        """
+        with contextlib.ExitStack() as stack:
+            if cache_dir is None and max_points is not None:
+                # Without a cache folder all the series would be kept in memory before decimating them
+                cache_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            telemetry = stack.enter_context(self.mission_telemetry(mission_folder_path, cache_dir=cache_dir,
+                                                                   max_workers=max_workers))
+            if max_points is None:
+                total_board = telemetry.to_dataframe()
+            else:
+                total_board = telemetry.decimate(['V', 'P'], max_points=max_points)
 
         if ax is None:
             fig, ax = plt.subplots()
@@ -150,28 +243,53 @@ class RTSys(Hydrophone):
 
         return board_info['dP'].sum() / 3600
 
-    def compute_consumption_total_mission(self, mission_folder_path):
+    def compute_consumption_total_mission(self, mission_folder_path, cache_dir=None, max_workers=1):
         """
-        Calculate the total energy consumption of the file
+        Calculate the total energy consumption of the mission
 
         Parameters
         ----------
         mission_folder_path : str or Path
+        cache_dir : str or Path
+            Folder where to cache the consumption of each board file, so only the new or modified board files are
+            parsed in the next calls (see mission_telemetry)
+        max_workers : int
+            Maximum number of board files parsed at the same time (see mission_telemetry)
 
         Returns
         -------
         Total consumption in the mission
         """
-        if not isinstance(mission_folder_path, pathlib.Path):
-            mission_folder_path = pathlib.Path(mission_folder_path)
-
-        total_consumption = 0
-        for board_file_i in mission_folder_path.glob('**/*.txt'):
-            if 'board' in board_file_i.name:
-                total_consumption += self.compute_consumption(board_file_i)
+        # Only the consumption of each file is needed, the series are not kept
+        with self.mission_telemetry(mission_folder_path, cache_dir=cache_dir, max_workers=max_workers,
+                                    keep_series=False) as telemetry:
+            total_consumption = telemetry.total_consumption()
 
         return total_consumption
 
+    @staticmethod
+    def _read_header_bytes(f):
+        """
+        Read the beginning of the open file f, up to the end of the configuration fields
+        """
+        header_bytes = f.read(HEADER_DTYPE.itemsize)
+        if len(header_bytes) < HEADER_DTYPE.itemsize:
+            raise ValueError(f'The file is too short ({len(header_bytes)} bytes) to have a RTSys header')
+        return header_bytes
+
+    @staticmethod
+    def _decode_headers(headers):
+        """
+        Convert the structured array of headers to a dictionary of columns, with the strings decoded
+        """
+        columns = {}
+        for name, field_format, _ in HEADER_FIELDS:
+            if isinstance(field_format, tuple):
+                columns[name] = [bytes.decode(value.tobytes()) for value in headers[name]]
+            else:
+                columns[name] = headers[name]
+        return columns
+
     @staticmethod
     def read_header(file_path, zip_mode=False):
         """
@@ -186,51 +304,88 @@ class RTSys(Hydrophone):
         -------
         extra_header: dictionary with all the parameters of the configuration provided by RTSys
         """
-        HEADER_CONF = {
-            'conf': {'format': 'c', 'start': 0, 'end': 4, 'n': 4},
-            'conf_size': {'format': 'I', 'start': 4, 'end': 8, 'n': 1},
-            'conf_version': {'format': 'I', 'start': 8, 'end': 12, 'n': 1},
-            'epoch_time_recording': {'format': 'd', 'start': 16, 'end': 24, 'n': 1},
-            'channel': {'format': 'c', 'start': 23, 'end': 24, 'n': 1},
-            'sr': {'format': 'f', 'start': 28, 'end': 32, 'n': 1},
-            'hydrophone_sensitivity_A': {'format': 'f', 'start': 32, 'end': 36, 'n': 1},
-            'hydrophone_sensitivity_B': {'format': 'f', 'start': 36, 'end': 40, 'n': 1},
-            'hydrophone_sensitivity_C': {'format': 'f', 'start': 40, 'end': 44, 'n': 1},
-            'hydrophone_sensitivity_D': {'format': 'f', 'start': 44, 'end': 48, 'n': 1},
-            'hydrophone_amplification_A': {'format': 'f', 'start': 48, 'end': 52, 'n': 1},
-            'hydrophone_amplification_B': {'format': 'f', 'start': 52, 'end': 56, 'n': 1},
-            'hydrophone_amplification_C': {'format': 'f', 'start': 56, 'end': 60, 'n': 1},
-            'hydrophone_amplification_D': {'format': 'f', 'start': 60, 'end': 64, 'n': 1},
-            'correction_factor_A': {'format': 'f', 'start': 64, 'end': 68, 'n': 1},
-            'correction_factor_B': {'format': 'f', 'start': 68, 'end': 72, 'n': 1},
-            'correction_factor_C': {'format': 'f', 'start': 72, 'end': 76, 'n': 1},
-            'correction_factor_D': {'format': 'f', 'start': 76, 'end': 80, 'n': 1},
-            'serial_number': {'format': 'f', 'start': 80, 'end': 96, 'n': 4},
-            'active_channels': {'format': 'c', 'start': 100, 'end': 104, 'n': 4}
-        }
-
         if zip_mode == True:
-            path_zip = file_path.split('.zip')[0] + '.zip'
-            file_zip = os.path.relpath(file_path, start=path_zip).replace('\\', '/')
-            zipFolder = zipfile.ZipFile(path_zip, 'r')
-            f = zipFolder.open(file_zip)
+            # The zip stays open for the next files (see pyhydrophone.archive)
+            with default_archive_cache.open(file_path) as f:
+                header_bytes = RTSys._read_header_bytes(f)
         else:
-            f = open(file_path, 'rb')
-        f.seek(40)
-        config_size = struct.unpack('I', f.read(4))[0]
-        f.seek(36)
-        header_buffer = f.read(config_size)
-        f.close()
+            with open(file_path, 'rb') as f:
+                header_bytes = RTSys._read_header_bytes(f)
+        columns = RTSys._decode_headers(np.frombuffer(header_bytes, dtype=HEADER_DTYPE))
         extra_header = {}
-        for chunk_name, chunk_format in HEADER_CONF.items():
-            if (chunk_format['n'] == 1) & (chunk_format['format'] != 'c'):
-                extra_header[chunk_name] = struct.unpack(chunk_format['format'],
-                                                         header_buffer[chunk_format['start']:chunk_format['end']])[0]
-            else:
-                extra_header[chunk_name] = bytes.decode(header_buffer[chunk_format['start']:chunk_format['end']])
+        for name, values in columns.items():
+            value = values[0]
+            extra_header[name] = value.item() if isinstance(value, np.generic) else value
 
         return extra_header
 
+    @staticmethod
+    def read_headers(file_paths, zip_mode=False):
+        """
+        Read the headers of many .wav files at once, decoding all of them together. In zip mode, the zip files are
+        kept open between files (see pyhydrophone.archive)
+
+        Parameters
+        ----------
+        file_paths: list of Path or string
+            Paths to the .wav files to read the header from. In zip mode, path of the zip joined with the path of the
+            file inside the zip
+        zip_mode: bool
+            True if the files are zipped
+
+        Returns
+        -------
+        DataFrame with one row per file, with the column file_path and one column per parameter of the configuration
+        (see read_header). Files which can not be read are skipped
+        """
+        read_paths = []
+        buffer = bytearray()
+        for file_path in file_paths:
+            try:
+                if zip_mode:
+                    f = default_archive_cache.open(file_path)
+                else:
+                    f = open(file_path, 'rb')
+                with f:
+                    buffer += RTSys._read_header_bytes(f)
+                read_paths.append(file_path)
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                print(f'{file_path} has some problem and can not be read: {e}')
+
+        headers = RTSys._decode_headers(np.frombuffer(buffer, dtype=HEADER_DTYPE))
+        df = pd.DataFrame(headers)
+        df.insert(0, 'file_path', read_paths)
+        return df
+
+    def read_file_metadata(self, file_path, zip_mode=False):
+        """
+        Read the metadata of one sound file from its header, including the RTSys configuration of the channel
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Sound file to read the metadata from
+        zip_mode: bool
+            True if file is zipped, otherwise false
+
+        Returns
+        -------
+        Dictionary with the duration, samplerate, channels and frames of the file, and the epoch_time_recording,
+        sensitivity and preamp_gain from the RTSys header (only if the header can be read)
+        """
+        metadata = {}
+        if not zip_mode:
+            metadata = super().read_file_metadata(file_path)
+        try:
+            header = self.read_header(file_path, zip_mode)
+            _, _, _, sens, ampl = self.meta_from_header(header)
+        except (ValueError, KeyError) as e:
+            print(f'The RTSys header of {file_path} can not be read: {e}')
+            return metadata
+        metadata.update({'epoch_time_recording': header['epoch_time_recording'], 'sensitivity': sens,
+                         'preamp_gain': ampl})
+        return metadata
+
     def update_metadata(self, file_path, zip_mode=False):
         """
         Creates a new RTSys object from an already existing one but updating the metadata from the file header.
@@ -286,6 +441,6 @@ class RTSys(Hydrophone):
         self.preamp_gain = ampl
         self.Vpp = 5.0
 
-    def get_freq_cal(self, val='sensitivity', sep=';', freq_col_id=0, val_col_id=1, start_data_id=0):
+    def get_freq_cal(self, val='sensitivity', sep=';', freq_col_id=0, val_col_id=1, start_data_id=0, cache_dir=None):
         super().get_freq_cal(sep=sep, val=val, freq_col_id=freq_col_id, val_col_id=val_col_id,
-                             start_data_id=start_data_id)
+                             start_data_id=start_data_id, cache_dir=cache_dir)
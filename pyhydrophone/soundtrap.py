@@ -1,8 +1,13 @@
 #!/usr/bin/python
 from pyhydrophone.hydrophone import Hydrophone
+from pyhydrophone.utils import parallel_map, glob_files
+from pyhydrophone.archive import default_archive_cache
 
 import os
-import zipfile
+import tempfile
+import functools
+import contextlib
+import itertools
 import numpy as np
 import pandas as pd
 import soundfile as sf
@@ -12,6 +17,71 @@ import xml
 import requests
 import pathlib
 import json
+import threading
+import collections
+
+
+# Parsed .log.xml files, per path (see SoundTrap.read_log_xml)
+_LOG_XML_CACHE = collections.OrderedDict()
+_LOG_XML_CACHE_SIZE = 4096
+_LOG_XML_CACHE_LOCK = threading.Lock()
+
+# Fields of the .log.xml which are only complete when all the file has been parsed
+_LOG_XML_SECTIONS = ['cfg', 'proc_events', 'wav_file_handler']
+
+
+def _parse_log_xml(xml_file, fields=None):
+    """
+    Parse a SoundTrap .log.xml file in one pass, keeping only the children of the root being processed in memory.
+    If fields is set, the parsing stops as soon as all these fields have been found (see SoundTrap.read_log_xml)
+    """
+    log = {'cfg': {}, 'proc_events': {}, 'wav_file_handler': {}}
+    if fields is not None:
+        fields = set(fields)
+        if not fields.isdisjoint(_LOG_XML_SECTIONS):
+            # They are only complete at the end of the file
+            fields = None
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+
+        if elem.tag == 'EVENT':
+            for child in elem:
+                if child.tag == 'START':
+                    log.setdefault('start_state', child.get('STATE'))
+                elif child.tag == 'TEMPERATURE':
+                    log.setdefault('temperature', float(child.text) / 100)
+                elif child.tag == 'AUDIO' and child.get('Gain') is not None:
+                    log.setdefault('gain', child.get('Gain'))
+        elif elem.tag == 'CFG':
+            cfg = {child.tag: (child.text or '').strip() for child in elem}
+            log['cfg'][elem.get('ID')] = cfg
+            if 'FS' in cfg:
+                log.setdefault('fs', float(cfg['FS']))
+            if 'PREDET' in cfg:
+                log.setdefault('predet', int(cfg['PREDET']))
+            if 'POSTDET' in cfg:
+                log.setdefault('postdet', int(cfg['POSTDET']))
+        elif elem.tag == 'PROC_EVENT':
+            for child in elem:
+                if child.tag == 'WavFileHandler':
+                    log['proc_events'].setdefault(elem.get('ID'), {}).update(child.attrib)
+                    log['wav_file_handler'].update(child.attrib)
+        # The processed elements are not needed anymore
+        root.clear()
+        if fields is not None and fields.issubset(log.keys()):
+            return log
+
+    log['complete'] = True
+    return log
 
 
 class SoundTrap(Hydrophone):
@@ -37,6 +107,11 @@ class SoundTrap(Hydrophone):
     calibration_file : string or Path
         File where the frequency dependent sensitivity values for the calibration are
     """
+    _name_datetime_regex = r'^[^.]*\.{}(?:\.|$)'
+    # Columns and types of the sensor files recorded next to each sound file
+    _sensor_columns = {'accel': {'unix_time': 'float64', 'x': 'int32', 'y': 'int32', 'z': 'int32'},
+                       'temp': {'unix_time': 'float64', 'temperature': 'float32'}}
+
     def __init__(self, name, model, serial_number, sensitivity=None, Vpp=2, gain_type='High',
                  string_format="%y%m%d%H%M%S", calibration_file=None,  **kwargs):
         self.azures_api_url = "https://www.data.oceaninstruments.co.nz/api/1.1"
@@ -105,6 +180,48 @@ class SoundTrap(Hydrophone):
         return cali[0]
 
 
+    @staticmethod
+    def read_log_xml(xml_path, fields=None):
+        """
+        Parse the .log.xml file of a recording in one single pass. The result is cached per path (the file is parsed
+        again if its modification time or size change), so several readers of the same file only parse it once.
+        If fields is set, the parsing stops as soon as these fields are found
+
+        Parameters
+        ----------
+        xml_path : str, Path or file object
+            Path to the .log.xml file. File objects (e.g. files in a zip) are parsed but not cached
+        fields : list of str
+            Fields needed, from: start_state, temperature, gain, fs, predet, postdet (first occurrences in the file),
+            cfg, proc_events and wav_file_handler. If None, all the file is parsed
+
+        Returns
+        -------
+        Dictionary with the fields found: start_state (STATE of START), temperature (degrees C), gain (Gain of
+        AUDIO, only if the recorder was started NEW), fs (first CFG FS), predet and postdet (samples), cfg (dictionary
+        with the children of each CFG per ID), proc_events (dictionary with the WavFileHandler attributes per
+        PROC_EVENT ID) and wav_file_handler (all the WavFileHandler attributes merged, the last ones prevail)
+        """
+        if not isinstance(xml_path, (str, pathlib.Path)):
+            return _parse_log_xml(xml_path, fields)
+
+        stat = os.stat(xml_path)
+        key = str(pathlib.Path(xml_path).resolve())
+        with _LOG_XML_CACHE_LOCK:
+            cached = _LOG_XML_CACHE.get(key)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            log = cached[2]
+            if log.get('complete', False) or (fields is not None and set(fields).issubset(log.keys())):
+                return log
+
+        log = _parse_log_xml(xml_path, fields)
+        with _LOG_XML_CACHE_LOCK:
+            _LOG_XML_CACHE[key] = (stat.st_mtime_ns, stat.st_size, log)
+            _LOG_XML_CACHE.move_to_end(key)
+            while len(_LOG_XML_CACHE) > _LOG_XML_CACHE_SIZE:
+                _LOG_XML_CACHE.popitem(last=False)
+        return log
+
     @staticmethod
     def read_file_specs(xmlfile_path, last_gain, date_format='%Y-%m-%dT%H:%M:%S'):
         """
@@ -119,24 +236,21 @@ class SoundTrap(Hydrophone):
         date_format : string
             Format of the datetime in the .log.xml file
         """
-        tree = ET.parse(xmlfile_path)
-        type_start = tree.find('EVENT/START').get('STATE')
+        log = SoundTrap.read_log_xml(xmlfile_path)
+        type_start = log['start_state']
 
         # Metadata colected
-        temp = float(tree.find('EVENT/TEMPERATURE').text)/100
+        temp = log['temperature']
 
         # WavFileHandler information
-        sampling_attr = {}
-        WavFileHandler = tree.findall('PROC_EVENT/WavFileHandler')
-        for wfh in WavFileHandler:
-            sampling_attr.update(wfh.attrib)
+        sampling_attr = log['wav_file_handler']
 
         # Info about the sampling
-        fs = float(tree.find('CFG/FS').text)
+        fs = log['fs']
 
         # Setup information. Read SoundTrap gain ('HIGH' or 'LOW')
         if type_start == 'NEW':
-            st_gain = tree.find('EVENT/AUDIO').get('Gain')
+            st_gain = log['gain']
         else:
             if last_gain is None:
                 print('Unknown gain if it is reopened and the last gain is not passed!')
@@ -148,6 +262,93 @@ class SoundTrap(Hydrophone):
         return {'type_start': type_start, 'temp': temp, 'fs': fs, 'st_gain': st_gain,
                 'start_time': start_time, 'stop_time': stop_time}
 
+    @staticmethod
+    def _log_xml_path(file_path):
+        """
+        Return the path of the .log.xml file of a .wav file
+        """
+        if type(file_path) == str:
+            return file_path.replace('.wav', '.log.xml')
+        return file_path.parent.joinpath(file_path.name.replace('.wav', '.log.xml'))
+
+    @staticmethod
+    def _wav_cfg_id(log, suffix='wav'):
+        """
+        Return the ID of the CFG of the files with the suffix in the parsed log (None if there is no such CFG)
+        """
+        for cfg_id, cfg in log['cfg'].items():
+            if cfg.get('SUFFIX') == suffix:
+                return cfg_id
+        return None
+
+    def read_file_metadata(self, file_path):
+        """
+        Read the metadata of one sound file from its header and from its .log.xml file (if it exists)
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Sound file to read the metadata from
+
+        Returns
+        -------
+        Dictionary with the duration, samplerate, channels and frames of the file, and the start_state,
+        temperature, start_utc and stop_utc from the .log.xml
+        """
+        metadata = super().read_file_metadata(file_path)
+        try:
+            log = self.read_log_xml(self._log_xml_path(file_path))
+        except (OSError, ET.ParseError):
+            return metadata
+        handler = log['proc_events'].get(self._wav_cfg_id(log), log['wav_file_handler'])
+        metadata.update({'start_state': log.get('start_state'), 'temperature': log.get('temperature'),
+                         'start_utc': pd.to_datetime(handler.get('SamplingStartTimeUTC')),
+                         'stop_utc': pd.to_datetime(handler.get('SamplingStopTimeUTC'))})
+        return metadata
+
+    def read_log_folder(self, folder_path, include_dirs=False):
+        """
+        Read all the .log.xml files of a folder into one table
+
+        Parameters
+        ----------
+        folder_path : str or Path
+            Folder with the .log.xml files
+        include_dirs : bool
+            Set to True to also read the files in the subfolders
+
+        Returns
+        -------
+        DataFrame with one row per .log.xml file, sorted by path, with the columns log_path, start_state,
+        temperature, gain, fs (first CFG FS), wav_fs (FS of the .wav files), start_utc, stop_utc, start_local,
+        stop_local and sample_count (of the .wav file)
+        """
+        log_paths = glob_files(folder_path, '*.log.xml', include_dirs)
+        rows = []
+        for log_path in log_paths:
+            try:
+                log = self.read_log_xml(log_path)
+            except ET.ParseError as e:
+                print(f'{log_path} has some problem and can not be read: {e}')
+                continue
+            wav_id = self._wav_cfg_id(log)
+            handler = log['proc_events'].get(wav_id, log['wav_file_handler'])
+            wav_fs = log['cfg'][wav_id].get('FS') if wav_id is not None else None
+            rows.append({'log_path': log_path, 'start_state': log.get('start_state'),
+                         'temperature': log.get('temperature'), 'gain': log.get('gain'), 'fs': log.get('fs'),
+                         'wav_fs': None if wav_fs is None else float(wav_fs),
+                         'start_utc': handler.get('SamplingStartTimeUTC'),
+                         'stop_utc': handler.get('SamplingStopTimeUTC'),
+                         'start_local': handler.get('SamplingStartTimeLocal'),
+                         'stop_local': handler.get('SamplingStopTimeLocal'),
+                         'sample_count': handler.get('SampleCount')})
+        logs = pd.DataFrame(rows, columns=['log_path', 'start_state', 'temperature', 'gain', 'fs', 'wav_fs',
+                                           'start_utc', 'stop_utc', 'start_local', 'stop_local', 'sample_count'])
+        for col in ['start_utc', 'stop_utc', 'start_local', 'stop_local']:
+            logs[col] = pd.to_datetime(logs[col], format='%Y-%m-%dT%H:%M:%S')
+        logs['sample_count'] = logs['sample_count'].astype('Int64')
+        return logs
+
     def get_name_datetime(self, file_name):
         """
         Get the data and time of recording from the name of the file
@@ -163,6 +364,131 @@ class SoundTrap(Hydrophone):
         date = super().get_name_datetime(date_string)
         return date
 
+    def _sensor_chunk(self, sensor_data):
+        """
+        Add the datetime column (UTC, naive, the same clock as the file names) to the sensor data
+        """
+        sensor_data.insert(0, 'datetime', pd.to_datetime(sensor_data['unix_time'], unit='s').astype('datetime64[ns]'))
+        return sensor_data
+
+    def read_sensor_file(self, file_path, sensor=None, chunksize=None):
+        """
+        Read a sensor file recorded with a sound file (.accel.csv or .temp.csv)
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Path to the sensor file
+        sensor : str
+            'accel' or 'temp'. If None, it is read from the name of the file
+        chunksize : int
+            If set, return an iterator of DataFrames of chunksize rows instead of one DataFrame
+
+        Returns
+        -------
+        DataFrame (or iterator of DataFrames) with the columns datetime (UTC), unix_time and x, y, z (accel, raw
+        values) or temperature (temp, degrees C)
+        """
+        file_path = pathlib.Path(file_path)
+        if sensor is None:
+            sensor = file_path.name.split('.')[-2]
+        if sensor not in self._sensor_columns:
+            raise ValueError(f'Sensor {sensor} is not implemented. Only {list(self._sensor_columns.keys())} are '
+                             f'valid values')
+        columns = self._sensor_columns[sensor]
+        sensor_data = pd.read_csv(file_path, header=0, names=list(columns.keys()), dtype=columns,
+                                  skipinitialspace=True, chunksize=chunksize, engine='c')
+        if chunksize is None:
+            return self._sensor_chunk(sensor_data)
+        return (self._sensor_chunk(chunk) for chunk in sensor_data)
+
+    def iter_sensor_folder(self, folder_path, sensor='accel', include_dirs=False, chunksize=None):
+        """
+        Read the sensor files of all the folder one by one (or chunk by chunk), sorted by name
+
+        Parameters
+        ----------
+        folder_path : str or Path
+            Folder with the sensor files
+        sensor : str
+            'accel' or 'temp'
+        include_dirs : bool
+            Set to True to also read the files in the subfolders
+        chunksize : int
+            If set, the files are read in chunks of chunksize rows
+
+        Returns
+        -------
+        Generator of DataFrames (see read_sensor_file)
+        """
+        file_paths = glob_files(folder_path, '*.%s.csv' % sensor, include_dirs)
+        for file_path in file_paths:
+            if chunksize is None:
+                yield self.read_sensor_file(file_path, sensor)
+            else:
+                yield from self.read_sensor_file(file_path, sensor, chunksize=chunksize)
+
+    def read_sensor_folder(self, folder_path, sensor='accel', include_dirs=False, chunksize=None):
+        """
+        Read the sensor files of all the folder in one DataFrame sorted by time. See iter_sensor_folder for the
+        parameters
+
+        Returns
+        -------
+        DataFrame with the columns of read_sensor_file
+        """
+        chunks = list(self.iter_sensor_folder(folder_path, sensor=sensor, include_dirs=include_dirs,
+                                              chunksize=chunksize))
+        if len(chunks) == 0:
+            columns = self._sensor_columns[sensor]
+            return self._sensor_chunk(pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in columns.items()}))
+        sensor_data = pd.concat(chunks, ignore_index=True)
+        return sensor_data.sort_values('datetime', kind='stable', ignore_index=True)
+
+    @staticmethod
+    def align_sensor_data(data, sensor_data, on='datetime', direction='backward', tolerance=None):
+        """
+        Add to each row of data (e.g. calibrated audio windows or clicks) the values of the sensor at that time, with
+        an as-of join
+
+        Parameters
+        ----------
+        data : DataFrame
+            Data with a datetime column (UTC)
+        sensor_data : DataFrame
+            Sensor data, as returned by read_sensor_folder
+        on : str
+            Name of the datetime column of data
+        direction : str
+            'backward' to use the last sensor value before each row, 'forward' the next one or 'nearest' the closest
+        tolerance : timedelta or str
+            Maximum time between the row and the sensor value. If None, no limit
+
+        Returns
+        -------
+        DataFrame with the rows of data (in the same order and with the same index) and the sensor columns. Rows
+        without datetime get no sensor values
+        """
+        if tolerance is not None:
+            tolerance = pd.Timedelta(tolerance)
+        sensor_data = sensor_data.drop(columns='unix_time').rename(columns={'datetime': on})
+        # Both keys need the same datetime resolution
+        sensor_data[on] = sensor_data[on].astype(data[on].dtype)
+        sensor_data = sensor_data.sort_values(on, kind='stable')
+        keys = data[on].to_numpy()
+        missing = np.flatnonzero(pd.isna(keys))
+        valid = np.flatnonzero(~pd.isna(keys))
+        order = valid[np.argsort(keys[valid], kind='stable')]
+        aligned = pd.merge_asof(data.iloc[order], sensor_data, on=on, direction=direction, tolerance=tolerance)
+        if len(missing) > 0:
+            # merge_asof does not accept null keys, these rows are added back without sensor values
+            aligned = pd.concat([aligned, data.iloc[missing]], ignore_index=True)
+            order = np.concatenate([order, missing])
+        # Back to the order of data by position, as its index can have duplicates
+        aligned = aligned.iloc[np.argsort(order, kind='stable')]
+        aligned.index = data.index
+        return aligned
+
     @staticmethod
     def get_xml_utc_datetime(file_path):
         """
@@ -173,16 +499,10 @@ class SoundTrap(Hydrophone):
         file_path : str or Path
 
         """
-        if type(file_path) == str:
-            xml_name = file_path.replace('.wav', '.log.xml')
-        else:
-            xml_name = file_path.parent.joinpath(file_path.name.replace('.wav', '.log.xml'))
-
-        tree = ET.parse(xml_name)
-        WavFileHandler_list = tree.findall('PROC_EVENT/WavFileHandler')
-        for wfh in WavFileHandler_list:
-            if 'SamplingStartTimeUTC' in wfh.attrib.keys():
-                utc_datetime = datetime.strptime(wfh.attrib.values(), format='%Y-%m-%dTH:M:S')
+        log = SoundTrap.read_log_xml(SoundTrap._log_xml_path(file_path))
+        for attributes in log['proc_events'].values():
+            if 'SamplingStartTimeUTC' in attributes.keys():
+                utc_datetime = datetime.strptime(attributes['SamplingStartTimeUTC'], '%Y-%m-%dT%H:%M:%S')
                 return utc_datetime
 
         return None
@@ -241,7 +561,93 @@ class SoundTrapHF(SoundTrap):
                          gain_type=gain_type, Vpp=2, string_format=string_format,
                          calibration_file=calibration_file, **kwargs)
 
-    def read_HFfolder(self, main_folder_path, zip_mode=False, include_dirs=False):
+    def _list_HFfiles(self, main_folder_path, zip_mode=False, include_dirs=False):
+        """
+        List all the wav files of the folder. In zip mode, the paths are the path of the zip file joined with the name
+        of the file inside the zip. The zip files are opened through the shared cache of open zip files (see
+        pyhydrophone.archive), so they are not opened again to read their members
+        """
+        if type(main_folder_path) == str:
+            main_folder_path = pathlib.Path(main_folder_path)
+        if not zip_mode:
+            if include_dirs:
+                glob_str = '**/*.wav'
+            else:
+                glob_str = '*.wav'
+            for file_name in sorted(main_folder_path.glob(glob_str)):
+                yield file_name
+        else:
+            if include_dirs:
+                for zipped_dir in sorted(main_folder_path.glob('*')):
+                    yield from self._list_HFfiles(zipped_dir, zip_mode=zip_mode, include_dirs=False)
+            else:
+                files_list = default_archive_cache.get(main_folder_path).namelist()
+                for file_name in files_list:
+                    if file_name.split('.')[-1] == 'wav':
+                        yield main_folder_path.joinpath(file_name)
+
+    def _read_HFclicks_file_to_npy(self, wavfile_path, zip_mode, waves_dtype, tmp_dir, **filters):
+        """
+        Read the clicks of one file in a worker process. The waves are saved to a .npy file in tmp_dir, so only the
+        clicks table and the path of the waves are sent back to the main process
+        """
+        clicks, waves = self.read_HFclicks_file(wavfile_path, zip_mode, waves_dtype=waves_dtype, **filters)
+        fd, waves_path = tempfile.mkstemp(dir=tmp_dir, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, waves)
+        return clicks, waves_path
+
+    def iter_HFfolder(self, main_folder_path, zip_mode=False, include_dirs=False, waves_dtype=None, n_workers=1,
+                      load_waves=True, start=None, end=None, query=None, zip_threads=1):
+        """
+        Read the clicks of all the folders file by file, yielding the clicks of each file in the order of the files.
+        Only the clicks of the files being processed are kept in memory. See read_HFfolder for the parameters
+
+        Returns
+        -------
+        Generator of one DataFrame per file (or a tuple (DataFrame, waves) if waves_dtype is not None)
+        """
+        files = self._list_HFfiles(main_folder_path, zip_mode=zip_mode, include_dirs=include_dirs)
+        if n_workers is None or n_workers <= 1:
+            if not zip_mode:
+                for file_name in files:
+                    yield self.read_HFclicks_file(file_name, zip_mode, waves_dtype=waves_dtype, load_waves=load_waves,
+                                                  start=start, end=end, query=query)
+                return
+            # Each zip file is opened only once (when listing it), and all its members are read through the same handle
+            for zip_path, zip_files in itertools.groupby(files, key=lambda file_name: file_name.parent):
+                read_file = functools.partial(self.read_HFclicks_file, zip_mode=True, waves_dtype=waves_dtype,
+                                              load_waves=load_waves, start=start, end=end, query=query,
+                                              zip_file=default_archive_cache.get(zip_path))
+                yield from parallel_map(read_file, zip_files, max_workers=zip_threads, executor='thread')
+            return
+
+        if not load_waves:
+            # Only the (small) clicks tables are returned by the workers
+            read_file = functools.partial(self.read_HFclicks_file, zip_mode=zip_mode, load_waves=False,
+                                          start=start, end=end, query=query)
+            yield from parallel_map(read_file, files, max_workers=n_workers, executor='process')
+            return
+
+        # The workers always return the waves as a separate array, written to a temporary .npy file
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            read_file = functools.partial(self._read_HFclicks_file_to_npy, zip_mode=zip_mode,
+                                          waves_dtype='float64' if waves_dtype is None else waves_dtype,
+                                          tmp_dir=tmp_dir, start=start, end=end, query=query)
+            for clicks, waves_path in parallel_map(read_file, files, max_workers=n_workers, executor='process'):
+                waves = np.load(waves_path)
+                os.remove(waves_path)
+                if waves_dtype is not None:
+                    yield clicks, waves
+                else:
+                    if 'wave_idx' in clicks.columns:
+                        loc = clicks.columns.get_loc('wave_idx')
+                        clicks.pop('wave_idx')
+                        clicks.insert(loc, 'wave', list(waves))
+                    yield clicks
+
+    def read_HFfolder(self, main_folder_path, zip_mode=False, include_dirs=False, waves_dtype=None, n_workers=1,
+                      load_waves=True, start=None, end=None, query=None, zip_threads=1):
         """
         Read all the clicks in all the folders. If zip_mode is True and include_dirs is True, only the INSIDE folders
         can be zipped inside a non-zipped folder. If only one zip folder is to be analyzed, then set include_dirs
@@ -255,39 +661,59 @@ class SoundTrapHF(SoundTrap):
             Set to True if the folders are zipped
         include_dirs : bool
             Set to True if folder needs to be analyzed recursively
+        waves_dtype : str
+            If None, the waveforms are returned in the column 'wave' of the DataFrame. Otherwise, they are returned
+            as a separate (n_clicks x click_len) array of this type ('float64', 'float32' or 'int16'), and the column
+            'wave_idx' of the DataFrame is the row of each click in this array
+        n_workers : int
+            Number of processes reading files at the same time. If 1, the files are read in the current process
+        load_waves : bool
+            If False, only the .bcl and .log.xml files are read, and the waveforms are not returned (waves_dtype is
+            ignored). They can be loaded later for the selected clicks with read_HFwaves
+        start, end, query :
+            Filters of the clicks, see read_HFclicks_file. If query is a function and n_workers > 1, it has to be
+            picklable (not a lambda)
+        zip_threads : int
+            In zip mode with n_workers = 1, number of threads reading the files of the same zip at the same time,
+            through the same zip handle
 
         Returns
         -------
-        A DataFrame with all the clicks of all the folders and a fs metadata parameter with the sampling rate
+        A DataFrame with all the clicks of all the folders and a fs metadata parameter with the sampling rate (and the
+        waves array if waves_dtype is not None and load_waves is True)
         """
-        if type(main_folder_path) == str:
-            main_folder_path = pathlib.Path(main_folder_path)
-        clicks = pd.DataFrame()
-        if not zip_mode:
-            if include_dirs:
-                glob_str = '**.wav'
-            else:
-                glob_str = '*.wav'
-            for file_name in main_folder_path.glob(glob_str):
-                clicks_file = self.read_HFclicks_file(file_name, zip_mode)
-                clicks = pd.concat([clicks, clicks_file])
-        else:
-            if include_dirs:
-                for zipped_dir in main_folder_path.glob('*'):
-                    clicks_file = self.read_HFfolder(zipped_dir, zip_mode=zip_mode, include_dirs=False)
-                    clicks = clicks.append(clicks_file)
-            else:
-                folder_path = zipfile.ZipFile(main_folder_path, 'r', allowZip64=True)
-                files_list = folder_path.namelist()
-                for file_name in files_list:
-                    if file_name.split('.')[-1] == 'wav':
-                        file_name = pathlib.Path(folder_path.filename).joinpath(file_name)
-                        clicks_file = self.read_HFclicks_file(file_name, zip_mode)
-                        clicks = clicks.append(clicks_file)
+        if not load_waves:
+            waves_dtype = None
+        files_clicks = list(self.iter_HFfolder(main_folder_path, zip_mode=zip_mode, include_dirs=include_dirs,
+                                               waves_dtype=waves_dtype, n_workers=n_workers,
+                                               load_waves=load_waves, start=start, end=end, query=query,
+                                               zip_threads=zip_threads))
+        return self._concat_HFclicks(files_clicks, waves_dtype=waves_dtype)
 
-        return clicks
-
-    def read_HFclicks_file(self, wavfile_path, zip_mode=False, click_len=None):
+    @staticmethod
+    def _concat_HFclicks(files_clicks, waves_dtype=None):
+        """
+        Concatenate the clicks of several files at once. If waves_dtype is not None, files_clicks is a list of
+        (clicks, waves) tuples, and the wave_idx are shifted to point to the concatenated waves
+        """
+        if waves_dtype is None:
+            if len(files_clicks) == 0:
+                return pd.DataFrame()
+            return pd.concat(files_clicks, ignore_index=True)
+
+        files_clicks = [(clicks, waves) for clicks, waves in files_clicks if len(clicks) > 0]
+        if len(files_clicks) == 0:
+            return pd.DataFrame(), np.zeros((0, 0), dtype=waves_dtype)
+        offset = 0
+        for clicks, waves in files_clicks:
+            clicks['wave_idx'] += offset
+            offset += len(waves)
+        clicks = pd.concat([clicks for clicks, _ in files_clicks], ignore_index=True)
+        waves = np.concatenate([waves for _, waves in files_clicks])
+        return clicks, waves
+
+    def read_HFclicks_file(self, wavfile_path, zip_mode=False, click_len=None, waves_dtype=None, load_waves=True,
+                           start=None, end=None, query=None, zip_file=None):
         """
         Read all the clicks stored in a folder with soundtrap files
 
@@ -299,36 +725,145 @@ class SoundTrapHF(SoundTrap):
             Set to True if the folders are zipped
         click_len : int
             Length of the click. Should be the sum of the parameters PREDET and POSTDET in the XML file of ST
+        waves_dtype : str
+            If None, the waveforms are returned in the column 'wave' of the DataFrame. Otherwise, they are returned
+            as a separate (n_clicks x click_len) array of this type ('float64', 'float32' or 'int16'), and the column
+            'wave_idx' of the DataFrame is the row of each click in this array. Floats are in the range -1 to 1, int16
+            are the raw values of the file
+        load_waves : bool
+            If False, only the .bcl and the .log.xml files are read (the .dwv is never opened), and the waveforms are
+            not returned. The columns filename and start_sample can be used to load them later with read_HFwaves
+        start : datetime
+            If set, only the clicks from start (UTC, as the datetime column) are returned
+        end : datetime
+            If set, only the clicks before end (UTC, as the datetime column) are returned
+        query : str or callable
+            If set, only the clicks matching the query are returned. It can be a boolean expression on the columns
+            (passed to DataFrame.eval, e.g. 'amp > 60') or a function returning a boolean mask from the DataFrame.
+            The columns of the .bcl file and start_sample, end_sample, duration, fs and datetime can be used.
+            Only the waveforms of the selected clicks are read from the .dwv file
+        zip_file : zipfile.ZipFile
+            Open zip file containing wavfile_path, to avoid opening the zip again for each file (only in zip mode).
+            If None, the zip file is taken from the shared cache of open zip files (see pyhydrophone.archive)
 
         Returns
         -------
-        A DataFrame with all the clicks and a fs metadata parameter with the sampling rate
+        A DataFrame with all the clicks and a fs metadata parameter with the sampling rate (and the waves array if
+        waves_dtype is not None and load_waves is True)
         """
+        if not load_waves:
+            waves_dtype = None
         if not isinstance(wavfile_path, pathlib.Path):
             wavfile_path = pathlib.Path(wavfile_path)
         bcl_name = wavfile_path.name.replace('.wav', '.bcl')
         dwv_name = wavfile_path.name.replace('.wav', '.dwv')
         xml_name = wavfile_path.name.replace('.wav', '.log.xml')
-        if zip_mode:
-            zip_file = zipfile.ZipFile(wavfile_path.parent, 'r', allowZip64=True)
-            bcl_path = zip_file.open(bcl_name)
-            dwv_path = zip_file.open(dwv_name)
-            xml_path = zip_file.open(xml_name)
-        else:
-            bcl_path = os.path.join(wavfile_path.parent, bcl_name)
-            dwv_path = os.path.join(wavfile_path.parent, dwv_name)
-            xml_path = os.path.join(wavfile_path.parent, xml_name)
+        dwv_path = wavfile_path.parent.joinpath(dwv_name)
 
         try:
-            file_clicks = self._read_HFclicks(bcl_path, dwv_path, xml_path, click_len)
-        except FileNotFoundError:
-            print(dwv_path, 'has some problem and can not be read')
-        if zip_mode:
-            dwv_path = wavfile_path.parent.joinpath(bcl_name)
-        file_clicks['filename'] = str(dwv_path)
+            with contextlib.ExitStack() as stack:
+                if zip_mode:
+                    if zip_file is None:
+                        zip_file = default_archive_cache.get(wavfile_path.parent)
+                    bcl_file = stack.enter_context(zip_file.open(bcl_name))
+                    dwv_file = stack.enter_context(zip_file.open(dwv_name)) if load_waves else None
+                    xml_file = stack.enter_context(zip_file.open(xml_name))
+                else:
+                    bcl_file = os.path.join(wavfile_path.parent, bcl_name)
+                    dwv_file = os.path.join(wavfile_path.parent, dwv_name)
+                    xml_file = os.path.join(wavfile_path.parent, xml_name)
+                if load_waves:
+                    file_clicks = self._read_HFclicks(bcl_file, dwv_file, xml_file, click_len,
+                                                      waves_dtype=waves_dtype, start=start, end=end, query=query)
+                else:
+                    file_clicks = self._read_HFclicks_info(bcl_file, xml_file, start=start, end=end, query=query)
+        except (FileNotFoundError, KeyError, RuntimeError, ValueError) as e:
+            print(dwv_path, 'has some problem and can not be read', e)
+            file_clicks = pd.DataFrame()
+            if waves_dtype is not None:
+                file_clicks = (file_clicks, np.zeros((0, click_len or 0), dtype=waves_dtype))
+        if waves_dtype is not None:
+            file_clicks[0]['filename'] = str(dwv_path)
+        else:
+            file_clicks['filename'] = str(dwv_path)
         return file_clicks
 
-    def _read_HFclicks(self, bcl_path, dwv_path, xml_path, click_len=None):
+    @staticmethod
+    def _add_HFclicks_columns(clicks_info, click_len, fs):
+        """
+        Add the position of each snippet in the .dwv file (start_sample, end_sample), its duration (in samples), the
+        sampling rate and the datetime of the click to the clicks info
+        """
+        clicks_info['start_sample'] = np.arange(len(clicks_info)) * click_len
+        clicks_info['end_sample'] = clicks_info['start_sample'] + click_len
+        clicks_info['duration'] = click_len
+        clicks_info['fs'] = fs
+        clicks_info['datetime'] = pd.to_datetime(clicks_info['rtime'] + clicks_info['mticks'] / 1e6, unit='s')
+        return clicks_info
+
+    @staticmethod
+    def _filter_HFclicks(clicks_info, start=None, end=None, query=None):
+        """
+        Select the clicks between start and end and matching the query (see read_HFclicks_file)
+        """
+        if start is None and end is None and query is None:
+            return clicks_info
+        mask = np.ones(len(clicks_info), dtype=bool)
+        if start is not None:
+            mask &= (clicks_info['datetime'] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (clicks_info['datetime'] < pd.Timestamp(end)).to_numpy()
+        if query is not None and len(clicks_info) > 0:
+            if callable(query):
+                mask &= np.asarray(query(clicks_info), dtype=bool)
+            else:
+                mask &= clicks_info.eval(query).to_numpy(dtype=bool)
+        return clicks_info[mask].reset_index(drop=True)
+
+    @staticmethod
+    def _read_bcl(bcl_path, n_waves=None):
+        """
+        Read the detections of the bcl file, keeping only the ones which have a snippet in the .dwv file
+        """
+        clicks_info = pd.read_csv(bcl_path)
+        clicks_info = clicks_info[(clicks_info['report'] == 'D') & (clicks_info['state'] == 1)]
+        if n_waves is not None and n_waves < len(clicks_info):
+            # Cut the clicks info if there are not enough snippets
+            clicks_info = clicks_info.iloc[:n_waves]
+        return clicks_info.reset_index(drop=True)
+
+    def _read_HFclicks_info(self, bcl_path, xml_path, start=None, end=None, query=None):
+        """
+        Read the clicks of one soundtrap file without opening the .dwv file. The sampling rate and the number of
+        samples of the .dwv are read from the .log.xml file
+
+        Parameters
+        ----------
+        bcl_path : str or Path
+            Path to the bcl file
+        xml_path : str or Path
+            Path to the .log.xml file
+        start, end, query :
+            Filters of the clicks, see read_HFclicks_file
+
+        Returns
+        -------
+        A DataFrame with all the parameters from the bcl file and the start_sample, end_sample, duration, fs and
+        datetime columns
+        """
+        try:
+            click_len, fs, n_samples = self.read_HFdwv_params(xml_path)
+        except ET.ParseError:
+            raise RuntimeError(f'XML file {xml_path} could not be parsed, the clicks can not be read without the '
+                               f'.dwv file')
+        n_waves = None if n_samples is None else n_samples // click_len
+        clicks_info = self._read_bcl(bcl_path, n_waves)
+        clicks_info = self._add_HFclicks_columns(clicks_info, click_len, fs)
+
+        return self._filter_HFclicks(clicks_info, start=start, end=end, query=query)
+
+    def _read_HFclicks(self, bcl_path, dwv_path, xml_path, click_len=None, waves_dtype=None, start=None, end=None,
+                       query=None):
         """
         Read the clicks of one soundtrap file
 
@@ -340,47 +875,289 @@ class SoundTrapHF(SoundTrap):
             Path to the dwv file
         xml_path : str or Path
             Path to the .log.xml file
+        click_len : int
+            Length of the click, only used if it can not be read from the xml file
+        waves_dtype : str
+            If None, the waveforms are returned in the column 'wave'. Otherwise, they are returned as a separate
+            (n_clicks x click_len) array of this type, and the column 'wave_idx' is the row of each click
+        start, end, query :
+            Filters of the clicks, see read_HFclicks_file. Only the snippets of the selected clicks are read
 
         Returns
         -------
-        A DataFrame with all the parameters from the bcl file + a column with the wave and a column with the datetime
+        A DataFrame with all the parameters from the bcl file + a column with the wave (or the wave_idx) and a column
+        with the datetime (and the waves array if waves_dtype is not None)
         """
 
         # Read the wav file with all the clicks
-        sound_file = sf.SoundFile(dwv_path, 'r')
+        with sf.SoundFile(dwv_path, 'r') as sound_file:
+            # click_len has to be checked automatically
+            try:
+                click_len = self.read_HFparams(xml_path=xml_path)
+            except xml.etree.ElementTree.ParseError:
+                if click_len is None:
+                    raise Exception(f'XML file {xml_path} could not be parsed, and click_len parameter is not set. '
+                                    f'Please provide the click_len parameter...')
+
+            # Read the info of clicks
+            n_waves = sound_file.frames // click_len
+            clicks_info = self._read_bcl(bcl_path, n_waves)
+
+            print(dwv_path, 'bcl:', len(clicks_info), 'dwv:', n_waves)
+            clicks_info = self._add_HFclicks_columns(clicks_info, click_len, sound_file.samplerate)
+            clicks_info = self._filter_HFclicks(clicks_info, start=start, end=end, query=query)
+
+            # The selected snippets are read in one contiguous (n_clicks x click_len) array. Each run of consecutive
+            # snippets is read at once (all the file if all the clicks are selected)
+            n_clicks = len(clicks_info)
+            read_dtype = 'float64' if waves_dtype is None else waves_dtype
+            waves = self._read_HFsnippets(sound_file, clicks_info['start_sample'].to_numpy(), click_len,
+                                          dtype=read_dtype)
+
+        wave_loc = clicks_info.columns.get_loc('start_sample')
+        if waves_dtype is None:
+            # Each row of the column is a view of the contiguous array
+            clicks_info.insert(wave_loc, 'wave', list(waves))
+        else:
+            clicks_info.insert(wave_loc, 'wave_idx', np.arange(n_clicks))
 
-        # click_len has to be checked automatically
-        try:
-            click_len = self.read_HFparams(xml_path=xml_path)
-        except xml.etree.ElementTree.ParseError:
-            if click_len is None:
-                raise Exception(f'XML file {xml_path} could not be parsed, and click_len parameter is not set. '
-                                f'Please provide the click_len parameter...')
+        if waves_dtype is not None:
+            return clicks_info, waves
+        return clicks_info
 
-        # Read the info of clicks
-        clicks_info = pd.read_csv(bcl_path)
-        clicks_info = clicks_info[clicks_info['report'] == 'D']
-        clicks_info = clicks_info[clicks_info['state'] == 1]
-        waves = []
+    @staticmethod
+    @contextlib.contextmanager
+    def _open_dwv(dwv_path, zip_mode=False):
+        """
+        Open a .dwv file as a SoundFile. In zip mode, dwv_path is the path of the zip file joined with the name of the
+        .dwv file inside the zip
+        """
+        if zip_mode:
+            with default_archive_cache.open(dwv_path) as f, sf.SoundFile(f, 'r') as sound_file:
+                yield sound_file
+        else:
+            with sf.SoundFile(dwv_path, 'r') as sound_file:
+                yield sound_file
 
-        for block in sound_file.blocks(blocksize=click_len):
-            waves.append(block.astype(float))
+    @staticmethod
+    def _read_HFsnippets(sound_file, start_samples, click_len, dtype='float64'):
+        """
+        Read the snippets starting at start_samples from the open .dwv sound_file. Consecutive snippets are read with
+        one single seek and read
 
-        print(dwv_path, 'bcl:', len(clicks_info), 'dwv:', len(waves))
+        Returns
+        -------
+        np.array (len(start_samples) x click_len) with the snippets in the order of start_samples
+        """
+        start_samples = np.asarray(start_samples, dtype=np.int64)
+        order = np.argsort(start_samples, kind='stable')
+        sorted_starts = start_samples[order]
+        waves = np.empty((len(start_samples), click_len), dtype=dtype)
+        # Runs of snippets which are contiguous in the file
+        breaks = np.concatenate([[0], np.flatnonzero(np.diff(sorted_starts) != click_len) + 1, [len(sorted_starts)]])
+        for run_start, run_end in zip(breaks[:-1], breaks[1:]):
+            if run_start == run_end:
+                continue
+            n_frames = (run_end - run_start) * click_len
+            sound_file.seek(sorted_starts[run_start])
+            run = sound_file.read(frames=n_frames, dtype=dtype, always_2d=True)[:, 0]
+            if len(run) < n_frames:
+                raise ValueError(f'{sound_file.name} does not have a complete snippet at sample '
+                                 f'{sorted_starts[run_start] + len(run) // click_len * click_len}')
+            waves[order[run_start:run_end]] = run.reshape(-1, click_len)
+        return waves
+
+    def read_HFwaves(self, clicks, dtype='float64', zip_mode=False):
+        """
+        Load the waveforms of the clicks from the .dwv files. It is meant to be used with clicks read with
+        load_waves=False, to only load the waveforms of the selected clicks. Only the snippets of the clicks are read
 
-        if len(waves) < len(clicks_info):
-            # Cut the clicks info if there are not enough snippets
-            clicks_info = clicks_info.loc[0:len(waves)]
+        Parameters
+        ----------
+        clicks : DataFrame
+            Clicks with the columns filename, start_sample and duration, as returned by read_HFclicks_file
+        dtype : str
+            Type of the waves ('float64', 'float32' or 'int16')
+        zip_mode : bool
+            Set to True if the clicks were read from zipped folders
 
-        clicks_info['wave'] = waves[0:len(clicks_info)]
-        clicks_info['start_sample'] = np.arange(len(clicks_info)) * click_len
-        clicks_info['end_sample'] = clicks_info['start_sample'] + click_len
-        clicks_info['duration'] = click_len
-        clicks_info['fs'] = sound_file.samplerate
-        clicks_info['datetime'] = pd.to_datetime(clicks_info['rtime'] + clicks_info['mticks'] / 1e6, unit='s')
+        Returns
+        -------
+        np.array (n_clicks x click_len) with the waveform of each click, in the order of the rows of clicks
+        """
+        click_lens = np.unique(clicks['duration'])
+        if len(click_lens) > 1:
+            raise ValueError(f'All the clicks must have the same length to be loaded together, not {click_lens}')
+        click_len = int(click_lens[0]) if len(click_lens) > 0 else 0
+        waves = np.empty((len(clicks), click_len), dtype=dtype)
+        start_samples = clicks['start_sample'].to_numpy()
+        for dwv_path, idx in clicks.groupby('filename', sort=False).indices.items():
+            with self._open_dwv(dwv_path, zip_mode) as sound_file:
+                waves[idx] = self._read_HFsnippets(sound_file, start_samples[idx], click_len, dtype=dtype)
+        return waves
+
+    def compute_click_features(self, clicks, waves=None, freq_cal=False, batch_size=8192, nfft=None, p_ref=1.0):
+        """
+        Compute the features of all the clicks in batches, with one FFT per batch. The waveforms are calibrated with
+        the end to end calibration of the hydrophone (and the frequency dependent calibration for the spectral
+        features if freq_cal is True). The features are:
+        peak_freq (Hz), centroid_freq (Hz), bandwidth_3db (Hz, width of the band around the peak with a power higher
+        than half of the peak), energy_duration (s, time between 5 % and 95 % of the energy of the snippet) and
+        rl_pp (peak to peak received level in db re p_ref). All the features but rl_pp are NaN for the snippets without
+        energy (all zeros)
 
-        return clicks_info.reset_index(drop=True)
+        Parameters
+        ----------
+        clicks : DataFrame
+            Clicks as returned by read_HFfolder or read_HFclicks_file, with the column 'fs' and the waveforms in the
+            column 'wave' or in waves
+        waves : np.array
+            Waveforms of the clicks if they were read with waves_dtype (rows pointed by the column 'wave_idx' of
+            clicks). None if the waveforms are in the column 'wave'
+        freq_cal : bool
+            Set to True to apply the frequency dependent calibration to the spectra
+        batch_size : int
+            Number of clicks processed at once
+        nfft : int
+            Length of the FFT. If None, the length of the clicks
+        p_ref : float
+            Reference pressure to compute db from
+
+        Returns
+        -------
+        A copy of clicks with the features as new columns
+        """
+        if freq_cal and self.freq_cal is None:
+            raise ValueError('freq_cal can not be applied because no calibration_file was given to the hydrophone')
+        features = {name: np.full(len(clicks), np.nan) for name in ['peak_freq', 'centroid_freq', 'bandwidth_3db',
+                                                                    'energy_duration', 'rl_pp']}
+        if len(clicks) == 0:
+            return clicks.assign(**features)
+
+        fs = np.unique(clicks['fs'])
+        if len(fs) > 1:
+            raise ValueError(f'All the clicks must have the same sampling rate to be processed together, not {fs}')
+        fs = fs[0]
+        gain_upa = 10 ** (self.end_to_end_calibration(p_ref=p_ref) / 20.0)
+        if waves is not None:
+            wave_idx = clicks['wave_idx'].to_numpy()
+            click_len = waves.shape[1]
+        else:
+            click_len = len(clicks['wave'].iloc[0])
+        if nfft is None:
+            nfft = click_len
+        frequencies = np.fft.rfftfreq(nfft, d=1 / fs)
+        bins = np.arange(len(frequencies))
+        if freq_cal:
+            compiled_freq_cal = self.compile_freq_cal(frequencies, p_ref=p_ref)
+
+        for batch_start in np.arange(0, len(clicks), batch_size):
+            batch = slice(batch_start, min(batch_start + batch_size, len(clicks)))
+            if waves is not None:
+                x = waves[wave_idx[batch]]
+            else:
+                x = np.stack(clicks['wave'].iloc[batch].to_numpy())
+            if np.issubdtype(x.dtype, np.integer):
+                # Same scaling as reading the file as float
+                x = x / -np.iinfo(x.dtype).min
+            x = x * gain_upa
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                features['rl_pp'][batch] = 20 * np.log10(x.max(axis=1) - x.min(axis=1))
+
+                energy = np.cumsum(x ** 2, axis=1)
+                # Snippets without any energy (all zeros) have no spectral nor duration features
+                silent = energy[:, -1] == 0
+                energy /= energy[:, -1:]
+                features['energy_duration'][batch] = ((energy >= 0.95).argmax(axis=1) -
+                                                      (energy >= 0.05).argmax(axis=1) + 1) / fs
+
+                psd = np.abs(np.fft.rfft(x, n=nfft, axis=1)) ** 2
+                if freq_cal:
+                    compiled_freq_cal.apply(psd, db=False)
+                peak_idx = psd.argmax(axis=1)
+                features['peak_freq'][batch] = frequencies[peak_idx]
+                features['centroid_freq'][batch] = (psd @ frequencies) / psd.sum(axis=1)
+
+                # Contiguous band around the peak with more than half of the power of the peak
+                below_half = psd < psd[np.arange(len(psd)), peak_idx][:, np.newaxis] / 2
+                low_idx = np.where(below_half & (bins < peak_idx[:, np.newaxis]), bins, -1).max(axis=1) + 1
+                high_idx = np.where(below_half & (bins > peak_idx[:, np.newaxis]), bins, len(bins)).min(axis=1) - 1
+                features['bandwidth_3db'][batch] = frequencies[high_idx] - frequencies[low_idx]
+
+            for name in ['peak_freq', 'centroid_freq', 'bandwidth_3db', 'energy_duration']:
+                features[name][batch][silent] = np.nan
+
+        return clicks.assign(**features)
+
+    @staticmethod
+    def save_HFclicks(output_path, clicks, waves=None):
+        """
+        Save the clicks in a columnar format: the table of clicks (without the waveforms) in a parquet file
+        (clicks.parquet) and the waveforms in a (n_clicks x click_len) matrix in a .npy file (waves.npy).
+        Writing parquet files needs pyarrow (pip install pyhydrophone[parquet]) or fastparquet to be installed
 
+        Parameters
+        ----------
+        output_path : str or Path
+            Folder where to save the two files. It is created if it does not exist
+        clicks : DataFrame
+            Clicks as returned by read_HFfolder or read_HFclicks_file, with the waveforms in the column 'wave' or
+            in waves
+        waves : np.array
+            Waveforms of the clicks if they were read with waves_dtype, with the column 'wave_idx' in clicks. None if
+            the waveforms are in the column 'wave' of clicks (or if there are no waveforms)
+        """
+        output_path = pathlib.Path(output_path)
+        output_path.mkdir(parents=True, exist_ok=True)
+        waves_path = output_path.joinpath('waves.npy')
+        if waves is not None:
+            # Only keep the waves of the clicks, in the order of the table
+            wave_idx = clicks['wave_idx'].to_numpy()
+            if not np.array_equal(wave_idx, np.arange(len(waves))):
+                waves = waves[wave_idx]
+            np.save(waves_path, waves)
+            clicks = clicks.assign(wave_idx=np.arange(len(clicks)))
+        elif 'wave' in clicks.columns:
+            # The waves are written row by row, to not have a copy of all of them in memory
+            click_len = len(clicks['wave'].iloc[0]) if len(clicks) > 0 else 0
+            dtype = clicks['wave'].iloc[0].dtype if len(clicks) > 0 else 'float64'
+            waves = np.lib.format.open_memmap(waves_path, mode='w+', dtype=dtype, shape=(len(clicks), click_len))
+            for i, wave in enumerate(clicks['wave']):
+                waves[i] = wave
+            waves.flush()
+            del waves
+            loc = clicks.columns.get_loc('wave')
+            clicks = clicks.drop(columns='wave')
+            clicks.insert(loc, 'wave_idx', np.arange(len(clicks)))
+        clicks.to_parquet(output_path.joinpath('clicks.parquet'), index=False)
+
+    @staticmethod
+    def load_HFclicks(input_path, mmap_mode='r'):
+        """
+        Load the clicks saved with save_HFclicks. The waveforms are memory-mapped, so they are only read from disk
+        when they are accessed
+
+        Parameters
+        ----------
+        input_path : str or Path
+            Folder where the clicks were saved
+        mmap_mode : str
+            Memory-map mode of the waveforms (see np.load). 'r' for read-only, 'c' for copy-on-write or None to load
+            them in memory
+
+        Returns
+        -------
+        A DataFrame with all the clicks, with the column 'wave_idx' pointing to the rows of the waves, and the waves
+        matrix (None if no waveforms were saved)
+        """
+        input_path = pathlib.Path(input_path)
+        clicks = pd.read_parquet(input_path.joinpath('clicks.parquet'))
+        waves_path = input_path.joinpath('waves.npy')
+        waves = None
+        if waves_path.exists():
+            waves = np.load(waves_path, mmap_mode=mmap_mode)
+        return clicks, waves
 
     @staticmethod
     def read_HFparams(xml_path):
@@ -396,13 +1173,42 @@ class SoundTrapHF(SoundTrap):
         -------
         Clip length in samples (int)
         """
-        tree = ET.parse(xml_path)
-
-        # blank_len = int(tree.find('CFG/BLANKING').text)
-        clip_len = int(tree.find('CFG/PREDET').text) + int(tree.find('CFG/POSTDET').text)
+        # Only the CFG section is needed, the parsing stops there
+        log = SoundTrap.read_log_xml(xml_path, fields=['predet', 'postdet'])
+        clip_len = log['predet'] + log['postdet']
 
         return clip_len
 
+    @staticmethod
+    def read_HFdwv_params(xml_path):
+        """
+        Return the length of the clips, the sampling rate and the number of samples of the .dwv file, from the
+        .log.xml file
+
+        Parameters
+        ----------
+        xml_path : string or Path
+            Path to the .log.xml file
+
+        Returns
+        -------
+        Clip length in samples (int), sampling rate of the .dwv (int) and number of samples of the .dwv (int, None if
+        it is not in the file)
+        """
+        log = SoundTrap.read_log_xml(xml_path)
+        clip_len = log['predet'] + log['postdet']
+
+        dwv_id = SoundTrap._wav_cfg_id(log, suffix='dwv')
+        if dwv_id is None:
+            raise RuntimeError(f'XML file {xml_path} does not have the configuration of the .dwv file')
+        fs = int(log['cfg'][dwv_id]['FS'])
+
+        n_samples = log['proc_events'].get(dwv_id, {}).get('SampleCount')
+        if n_samples is not None:
+            n_samples = int(n_samples)
+
+        return clip_len, fs, n_samples
+
 
 class SoundTrap640(SoundTrap): 
     """
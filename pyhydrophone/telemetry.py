@@ -0,0 +1,276 @@
+#!/usr/bin/python
+from pyhydrophone.utils import parallel_map
+
+import os
+import pathlib
+import sqlite3
+import hashlib
+import tempfile
+import functools
+import numpy as np
+import pandas as pd
+
+
+# Columns of the board series stored per file
+SERIES_COLUMNS = ['T', 'V', 'I', 'P']
+
+
+def _read_board_file(parse_board_file, file_path, keep_series=True):
+    """
+    Parse a board file and return its series (timestamp in ns and float32 measurements, None if keep_series is False),
+    its energy consumption in Wh, its first and last timestamps (ns, None if empty) and its number of rows. It is run
+    in the worker processes of MissionTelemetry.refresh
+    """
+    board_info = parse_board_file(file_path)
+    board_info = board_info.dropna(subset=['timestamp'])
+    timestamps = board_info['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    start = int(timestamps.min()) if len(timestamps) > 0 else None
+    end = int(timestamps.max()) if len(timestamps) > 0 else None
+    energy = float(board_info['dP'].sum() / 3600)
+    series = None
+    if keep_series:
+        series = {'timestamp': timestamps}
+        for col in SERIES_COLUMNS:
+            series[col] = board_info[col].to_numpy(dtype=np.float32)
+    return series, energy, start, end, len(timestamps)
+
+
+class MissionTelemetry:
+    """
+    Store of the board telemetry (temperature, voltage, current and power) of all the board files of a RTSys mission.
+    The energy consumption of each file and its parsed series are cached, and refresh only parses the files which are
+    new or have been modified (different modification time or size) since the last refresh. The per-file totals are
+    stored in a SQLite file and the series in one .npz file per board file, both in cache_dir
+
+    Parameters
+    ----------
+    hydrophone : RTSys object
+        Hydrophone which recorded the mission, used to parse the board files
+    mission_folder_path : str or Path
+        Folder of the mission. The board files are all the .txt files with 'board' in the name, also in subfolders
+    cache_dir : str or Path
+        Folder where to store the cache. If None, the cache is only kept in memory, including the series of all the
+        board files
+    max_workers : int
+        Maximum number of board files parsed at the same time (in processes) during refresh. If 1, they are parsed in
+        the current process
+    keep_series : bool
+        If False, only the totals of each file are stored (the series are dropped after parsing each file), so the
+        memory does not grow with the mission. iter_series, to_dataframe and decimate can then not be used
+    """
+    def __init__(self, hydrophone, mission_folder_path, cache_dir=None, max_workers=1, keep_series=True):
+        self.hydrophone = hydrophone
+        self.mission_folder_path = pathlib.Path(mission_folder_path)
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.keep_series = keep_series
+        self._series = {}
+        if cache_dir is None:
+            index_path = ':memory:'
+        else:
+            self.cache_dir = pathlib.Path(cache_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            index_path = self.cache_dir.joinpath('telemetry.sqlite')
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS boards ('
+                                'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, start INTEGER, '
+                                'end INTEGER, n_rows INTEGER, energy REAL)')
+        self.connection.commit()
+
+    def close(self):
+        """
+        Close the connection to the cache
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _list_files(self):
+        """
+        Return a dictionary with the relative path of all the board files of the mission and their (mtime, size)
+        """
+        files = {}
+        for file_path in self.mission_folder_path.glob('**/*.txt'):
+            if 'board' in file_path.name:
+                stat = os.stat(file_path)
+                files[file_path.relative_to(self.mission_folder_path).as_posix()] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _series_path(self, relative_path):
+        return self.cache_dir.joinpath('board_%s.npz' % hashlib.sha1(relative_path.encode()).hexdigest())
+
+    def _save_series(self, relative_path, series):
+        if self.cache_dir is None:
+            self._series[relative_path] = series
+            return
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.npz.tmp', delete=False) as tmp_file:
+            np.savez(tmp_file, **series)
+        os.replace(tmp_file.name, self._series_path(relative_path))
+
+    def _load_series(self, relative_path):
+        if self.cache_dir is None:
+            return self._series[relative_path]
+        with np.load(self._series_path(relative_path)) as cached:
+            return {col: cached[col] for col in cached.files}
+
+    def _has_series(self, relative_path):
+        if self.cache_dir is None:
+            return relative_path in self._series
+        return self._series_path(relative_path).exists()
+
+    def _check_series(self):
+        if not self.keep_series:
+            raise ValueError('The series of the board files are not kept (keep_series=False)')
+
+    def _remove_series(self, relative_path):
+        if self.cache_dir is None:
+            self._series.pop(relative_path, None)
+        else:
+            self._series_path(relative_path).unlink(missing_ok=True)
+
+    def refresh(self):
+        """
+        Update the cache with the current board files of the mission. Only the new and modified files are parsed (in
+        parallel), and the files which are not in the mission anymore are removed from the cache. Files cached
+        without their series (keep_series=False) are parsed again if the series are kept
+
+        Returns
+        -------
+        Number of files which have been (re)parsed
+        """
+        files = self._list_files()
+        cached = {path: (mtime_ns, size) for path, mtime_ns, size in
+                  self.connection.execute('SELECT path, mtime_ns, size FROM boards')}
+        removed = [path for path in cached.keys() if path not in files]
+        changed = [path for path, stat in files.items()
+                   if cached.get(path) != stat or (self.keep_series and not self._has_series(path))]
+
+        read_file = functools.partial(_read_board_file, type(self.hydrophone)._parse_board_file,
+                                      keep_series=self.keep_series)
+        changed_paths = [self.mission_folder_path.joinpath(path) for path in changed]
+        rows = []
+        for path, (series, energy, start, end, n_rows) in zip(changed, parallel_map(
+                read_file, changed_paths, max_workers=self.max_workers, executor='process')):
+            if self.keep_series:
+                self._save_series(path, series)
+            rows.append((path, *files[path], start, end, n_rows, energy))
+
+        for path in removed:
+            self._remove_series(path)
+        with self.connection:
+            self.connection.executemany('DELETE FROM boards WHERE path = ?', [(path,) for path in removed])
+            self.connection.executemany('INSERT OR REPLACE INTO boards VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+        return len(changed)
+
+    def files(self):
+        """
+        Return the board files in the cache, sorted by start time
+
+        Returns
+        -------
+        DataFrame with the columns file_path, start, end (datetimes), n_rows and energy (consumption in Wh)
+        """
+        df = pd.read_sql_query('SELECT path, start, end, n_rows, energy FROM boards ORDER BY start, path',
+                               self.connection)
+        df.insert(0, 'file_path', [self.mission_folder_path.joinpath(path) for path in df['path']])
+        df['start'] = pd.to_datetime(df['start'], unit='ns')
+        df['end'] = pd.to_datetime(df['end'], unit='ns')
+        return df.drop(columns='path')
+
+    def total_consumption(self):
+        """
+        Return the total energy consumption of the mission (sum of the consumption of all the board files)
+
+        Returns
+        -------
+        Total consumption in Wh
+        """
+        total = self.connection.execute('SELECT SUM(energy) FROM boards').fetchone()[0]
+        return 0 if total is None else total
+
+    def iter_series(self):
+        """
+        Iterate over the series of the board files, sorted by start time. Only one file is loaded at a time
+
+        Returns
+        -------
+        Generator of DataFrames with the columns timestamp, T, V, I and P
+        """
+        self._check_series()
+        for (path,) in self.connection.execute('SELECT path FROM boards ORDER BY start, path').fetchall():
+            series = self._load_series(path)
+            df = pd.DataFrame({col: series[col] for col in SERIES_COLUMNS})
+            df.insert(0, 'timestamp', pd.to_datetime(series['timestamp'], unit='ns'))
+            yield df
+
+    def to_dataframe(self):
+        """
+        Return the series of all the board files in one DataFrame, sorted by start time of the files
+
+        Returns
+        -------
+        DataFrame with the columns timestamp, T, V, I and P
+        """
+        dfs = list(self.iter_series())
+        if len(dfs) == 0:
+            return pd.DataFrame({'timestamp': pd.Series(dtype='datetime64[ns]'),
+                                 **{col: pd.Series(dtype=np.float32) for col in SERIES_COLUMNS}})
+        return pd.concat(dfs, ignore_index=True)
+
+    def decimate(self, columns=('V', 'P'), max_points=4000):
+        """
+        Reduce the series of all the mission to at most max_points points to plot them, keeping their envelope. The
+        time of the mission is divided in max_points / 2 bins of the same duration, and the minimum and the maximum of
+        each column in each bin are kept. It is computed file by file, so with a cache_dir the series of the whole
+        mission are never loaded together (without it, they are all in memory already)
+
+        Parameters
+        ----------
+        columns : list of str
+            Columns to decimate, from T, V, I and P
+        max_points : int
+            Maximum number of points (rows) of the output, for example twice the width of the plot in pixels
+
+        Returns
+        -------
+        DataFrame with the columns timestamp (center of the bin) and the selected columns, with two rows per bin
+        with data: first the minimum and then the maximum of each column in the bin
+        """
+        self._check_series()
+        columns = list(columns)
+        start, end = self.connection.execute('SELECT MIN(start), MAX(end) FROM boards').fetchone()
+        if start is None:
+            return pd.DataFrame({'timestamp': pd.Series(dtype='datetime64[ns]'),
+                                 **{col: pd.Series(dtype=np.float32) for col in columns}})
+        n_bins = max(max_points // 2, 1)
+        bin_width = max((end - start) / n_bins, 1.0)
+        mins = {col: np.full(n_bins, np.inf, dtype=np.float32) for col in columns}
+        maxs = {col: np.full(n_bins, -np.inf, dtype=np.float32) for col in columns}
+        for (path,) in self.connection.execute('SELECT path FROM boards').fetchall():
+            series = self._load_series(path)
+            bins = np.clip(((series['timestamp'] - start) / bin_width).astype(np.int64), 0, n_bins - 1)
+            for col in columns:
+                values = series[col]
+                valid = ~np.isnan(values)
+                np.minimum.at(mins[col], bins[valid], values[valid])
+                np.maximum.at(maxs[col], bins[valid], values[valid])
+
+        has_data = np.zeros(n_bins, dtype=bool)
+        for col in columns:
+            has_data |= np.isfinite(mins[col])
+        bin_idx = np.flatnonzero(has_data)
+        centers = start + (bin_idx + 0.5) * bin_width
+        decimated = {'timestamp': pd.to_datetime(np.repeat(centers, 2).astype(np.int64), unit='ns')}
+        for col in columns:
+            values = np.column_stack([mins[col][bin_idx], maxs[col][bin_idx]]).ravel()
+            values[~np.isfinite(values)] = np.nan
+            decimated[col] = values
+        return pd.DataFrame(decimated)
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM boards').fetchone()[0]
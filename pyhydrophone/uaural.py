@@ -33,6 +33,8 @@ class uAural(Hydrophone):
     calibration_file : string or Path
         File where the frequency dependent sensitivity values for the calibration are
     """
+    _name_datetime_regex = r'^{}(?:[_.]|$)'
+
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format="%H%M%S_%Y%m%d",
                  calibration_file=None, **kwargs):
         super().__init__(name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format, calibration_file,
@@ -25,6 +25,8 @@ class uPam(Hydrophone):
     string_format : string
         Format of the datetime string present in the filename
     """
+    _name_datetime_regex = r'^[^._]*_{}(?:\.|$)'
+
     def __init__(self, name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format="%Y%m%d_%H%M%S_%f",
                  calibration_file=None, **kwargs):
         super().__init__(name, model, serial_number, sensitivity, preamp_gain, Vpp, string_format, calibration_file,
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+import pathlib
+import collections
+import concurrent.futures
+
+
+def glob_files(folder_path, pattern, include_dirs=False):
+    """
+    List the files of a folder matching a glob pattern
+
+    Parameters
+    ----------
+    folder_path : str or Path
+        Folder to list
+    pattern : str
+        Glob pattern of the files
+    include_dirs : bool
+        Set to True to also list the files in the subfolders
+
+    Returns
+    -------
+    List of Path, sorted
+    """
+    folder_path = pathlib.Path(folder_path)
+    if include_dirs:
+        return sorted(folder_path.rglob(pattern))
+    return sorted(folder_path.glob(pattern))
+
+
+def parallel_map(function, items, max_workers=8, executor='thread', max_pending=None):
+    """
+    Apply function to all the items in parallel, and yield the results in the same order than the items.
+    At most max_pending items are submitted at the same time, so long lists of items do not create all the tasks at once
+
+    Parameters
+    ----------
+    function : callable
+        Function to apply to each item. It has to be picklable if executor is 'process'
+    items : iterable
+        Items to process
+    max_workers : int
+        Number of threads or processes. If 1, the items are processed in the current thread
+    executor : str
+        'thread' for I/O bound functions or 'process' for CPU bound functions
+    max_pending : int
+        Maximum number of items submitted and not yet yielded. If None, 4 times max_workers
+
+    Returns
+    -------
+    Generator with the result of each item
+    """
+    if max_workers is None or max_workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    if executor == 'thread':
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    elif executor == 'process':
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        raise ValueError(f'executor {executor} is not implemented. Only thread or process are valid values')
+    if max_pending is None:
+        max_pending = 4 * max_workers
+
+    with pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
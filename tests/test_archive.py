@@ -0,0 +1,72 @@
+import sys
+import pathlib
+import unittest
+import tempfile
+import zipfile
+import concurrent.futures
+from pyhydrophone.archive import ArchiveCache, split_zip_path
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder_path = pathlib.Path(self.tmp_dir.name)
+        self.zip_paths = []
+        for i in range(3):
+            zip_path = self.folder_path.joinpath('mission_%s.zip' % i)
+            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                zip_file.writestr('day/file.wav', bytes([i]) * 100000)
+            self.zip_paths.append(zip_path)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_split_zip_path(self):
+        path_zip, file_zip = split_zip_path(self.zip_paths[0].joinpath('day', 'file.wav'))
+        assert path_zip == str(self.zip_paths[0])
+        assert file_zip == 'day/file.wav'
+
+    def test_cache(self):
+        with ArchiveCache(max_open=2) as cache:
+            zip_file = cache.get(self.zip_paths[0])
+            assert cache.get(self.zip_paths[0]) is zip_file
+            assert cache.read(self.zip_paths[0].joinpath('day', 'file.wav'), 4) == bytes([0]) * 4
+
+            # The least recently used zip is closed
+            cache.get(self.zip_paths[1])
+            cache.get(self.zip_paths[2])
+            assert len(cache) == 2
+            assert zip_file.fp is None
+            assert cache.read(self.zip_paths[1].joinpath('day', 'file.wav'), 4) == bytes([1]) * 4
+
+            # A modified zip is opened again
+            zip_file = cache.get(self.zip_paths[2])
+            with zipfile.ZipFile(self.zip_paths[2], 'w') as new_zip_file:
+                new_zip_file.writestr('day/file.wav', bytes([5]) * 10)
+            assert cache.get(self.zip_paths[2]) is not zip_file
+            assert cache.read(self.zip_paths[2].joinpath('day', 'file.wav')) == bytes([5]) * 10
+        assert len(cache) == 0
+
+    def test_threads(self):
+        # Only one zip open at a time, so each thread closes the zip files of the other threads
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ArchiveCache(max_open=1) as cache:
+                file_paths = [zip_path.joinpath('day', 'file.wav') for zip_path in self.zip_paths] * 500
+                with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                    contents = list(executor.map(lambda file_path: cache.read(file_path, 4), file_paths))
+        finally:
+            sys.setswitchinterval(switch_interval)
+        for file_path, content in zip(file_paths, contents):
+            assert content == bytes([self.zip_paths.index(pathlib.Path(split_zip_path(file_path)[0]))]) * 4
+
+        # An open member can be read after its zip file is closed
+        with ArchiveCache(max_open=1) as cache:
+            with cache.open(self.zip_paths[0].joinpath('day', 'file.wav')) as f:
+                cache.get(self.zip_paths[1])
+                assert f.read(4) == bytes([0]) * 4
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import pathlib
+import shutil
+import pyhydrophone as pyhy
+import unittest
+import tempfile
+import datetime
+import numpy as np
+import soundfile as sf
+import pandas as pd
+
+fs = 1000
+file_duration = 60
+start_deployment = datetime.datetime(2021, 10, 11, 13, 0, 0)
+
+
+def write_deployment(folder_path, n_files=5):
+    """
+    Write a deployment of n_files of 60 s recorded with a RTSys, where each sample is its position in the deployment
+    """
+    for i in range(n_files):
+        start = start_deployment + datetime.timedelta(seconds=i * file_duration)
+        signal = (np.arange(fs * file_duration) + i * fs * file_duration) / (n_files * fs * file_duration)
+        file_name = 'channelA_%s.wav' % start.strftime('%Y-%m-%d_%H-%M-%S')
+        sf.write(folder_path.joinpath(file_name), signal, fs, subtype='FLOAT')
+
+
+class TestDeployment(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder_path = pathlib.Path(self.tmp_dir.name)
+        write_deployment(self.folder_path)
+        self.rtsys = pyhy.RTSys(name='RTSys', model='RESEA320', serial_number=2003001, sensitivity=-180,
+                                preamp_gain=0, Vpp=5, mode='lowpower')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_index(self):
+        index_path = self.folder_path.joinpath('index.sqlite')
+        with pyhy.DeploymentIndex(self.rtsys, self.folder_path, index_path=index_path) as index:
+            assert index.refresh() == 5
+            df = index.to_dataframe()
+            assert len(df) == 5
+            assert df['start'].iloc[1] == start_deployment + datetime.timedelta(seconds=file_duration)
+            assert (df['frames'] == fs * file_duration).all()
+            assert (df['samplerate'] == fs).all()
+
+        # Opening the index again only the modified files are read
+        first_file = df['file_path'].iloc[0]
+        sf.write(first_file, np.zeros(fs * 30), fs)
+        df['file_path'].iloc[-1].unlink()
+        with pyhy.DeploymentIndex(self.rtsys, self.folder_path, index_path=index_path) as index:
+            assert index.refresh() == 1
+            df = index.to_dataframe()
+            assert len(df) == 4
+            assert df['duration'].iloc[0] == 30
+
+    def test_index_metadata(self):
+        rtsys_test_folder = pathlib.Path(__file__).parent / "test_data" / "rtsys"
+        with pyhy.DeploymentIndex(self.rtsys, rtsys_test_folder) as index:
+            assert index.refresh() == 1
+            df = index.to_dataframe()
+        expected = self.rtsys.read_file_metadata(df['file_path'].iloc[0])
+        assert df['sensitivity'].iloc[0] == expected['sensitivity']
+        assert df['preamp_gain'].iloc[0] == expected['preamp_gain']
+
+    def test_index_metadata_types(self):
+        soundtrap_test_folder = pathlib.Path(__file__).parent / "test_data" / "soundtrap"
+        for xml_path in soundtrap_test_folder.glob('*.log.xml'):
+            shutil.copy(xml_path, self.folder_path)
+            sf.write(self.folder_path.joinpath(xml_path.name.replace('.log.xml', '.wav')), np.zeros(10), 48000)
+        soundtrap = pyhy.SoundTrap(name='SoundTrap', model='ST300HF', serial_number=67416073, sensitivity=-172.8)
+        scanned = soundtrap.scan_metadata(self.folder_path, pattern='67416073.*.wav')
+        with pyhy.DeploymentIndex(soundtrap, self.folder_path, pattern='67416073.*.wav') as index:
+            index.refresh()
+            indexed = index.to_dataframe()
+        for col in ['start_utc', 'stop_utc', 'temperature']:
+            assert indexed[col].dtype == scanned[col].dtype
+            pd.testing.assert_series_equal(indexed[col], scanned[col])
+
+    def test_read_range(self):
+        n_samples = 5 * fs * file_duration
+        start = start_deployment + datetime.timedelta(seconds=50)
+        end = start_deployment + datetime.timedelta(seconds=130.5)
+        gain_upa = 10 ** (self.rtsys.end_to_end_calibration() / 20.0)
+        expected = np.arange(50 * fs, 130.5 * fs) / n_samples * gain_upa
+
+        signal = self.rtsys.read_range(self.folder_path, start, end)
+        np.testing.assert_allclose(signal, expected, rtol=1e-6)
+
+        blocks = [block.copy() for block in self.rtsys.read_range(self.folder_path, start, end, blocksize=7000)]
+        assert max(len(block) for block in blocks) <= 7000
+        np.testing.assert_allclose(np.concatenate(blocks), expected, rtol=1e-6)
+
+        with pyhy.DeploymentIndex(self.rtsys, self.folder_path) as index:
+            index.refresh()
+            signal = self.rtsys.read_range(self.folder_path, start, end, index=index, dtype='float32')
+            assert signal.dtype == np.float32
+            np.testing.assert_allclose(signal, expected, rtol=1e-5)
+
+    def test_scan_metadata(self):
+        self.folder_path.joinpath('channelA_2021-10-11_14-00-00.wav').write_bytes(b'not a wav file')
+        iclisten = pyhy.icListen(name='icListen', model=0, serial_number=0, sensitivity=-178, preamp_gain=0, Vpp=6,
+                                 string_format='%Y-%m-%d_%H-%M-%S')
+        df = iclisten.scan_metadata(self.folder_path, max_workers=4)
+        assert len(df) == 5
+        assert df['start'].is_monotonic_increasing
+        assert (df['frames'] == fs * file_duration).all()
+
+        rtsys_test_folder = pathlib.Path(__file__).parent / "test_data" / "rtsys"
+        df = self.rtsys.scan_metadata(rtsys_test_folder, max_workers=2)
+        assert len(df) == 1
+        assert 'sensitivity' in df.columns
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import pathlib
+import tempfile
+import pyhydrophone as pyhy
+import unittest
+import numpy as np
+import soundfile as sf
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+
+test_folder = CURRENT_DIR / "test_data" / "rtsys"
+test_file = test_folder / "channelA_2021-10-11_13-11-09.wav"
+calibration_file = test_folder / "SN130.csv"
+
+
+class TestHydrophone(unittest.TestCase):
+    def setUp(self) -> None:
+        self.hydrophone = pyhy.RTSys(name='RTSys', model='RESEA320', serial_number=2003001, sensitivity=-180,
+                                     preamp_gain=0, Vpp=5, mode='lowpower', calibration_file=calibration_file)
+
+    def test_read_calibrated_blocks(self):
+        signal, _ = sf.read(test_file)
+        gain_upa = 10 ** (self.hydrophone.end_to_end_calibration() / 20.0)
+        blocks = [block.copy() for block in self.hydrophone.read_calibrated_blocks(test_file, blocksize=10000)]
+        assert all(len(block) <= 10000 for block in blocks)
+        np.testing.assert_allclose(np.concatenate(blocks), signal * gain_upa)
+
+        blocks = [block.copy() for block in self.hydrophone.read_calibrated_blocks(test_file, blocksize=1000,
+                                                                                   start=500, stop=2700)]
+        np.testing.assert_allclose(np.concatenate(blocks), signal[500:2700] * gain_upa)
+
+    def test_compile_freq_cal(self):
+        frequencies = np.arange(2.4001e+04)
+        inc = self.hydrophone.freq_cal_inc(frequencies, as_array=True)
+        df = self.hydrophone.freq_cal_inc(frequencies)
+        np.testing.assert_array_equal(df['inc_value'].values, inc)
+        assert self.hydrophone.freq_cal_inc(frequencies.copy(), as_array=True) is inc
+        # Outside the calibrated range there is no increment
+        assert inc[0] == 0
+        assert not inc.flags.writeable
+
+        self.hydrophone.preamp_gain = 10.0
+        assert self.hydrophone.freq_cal_inc(frequencies, as_array=True) is not inc
+
+        for i in range(self.hydrophone.freq_cal_cache_size + 5):
+            self.hydrophone.compile_freq_cal(frequencies[i:])
+        assert len(self.hydrophone._freq_cal_cache) == self.hydrophone.freq_cal_cache_size
+
+    def test_apply_freq_cal(self):
+        frequencies = np.arange(2.4001e+04)
+        inc = self.hydrophone.freq_cal_inc(frequencies, as_array=True)
+        spectra = np.ones((10, len(frequencies)), dtype=np.float32)
+        out = self.hydrophone.apply_freq_cal(spectra, frequencies, db=True)
+        assert out is spectra
+        assert spectra.dtype == np.float32
+        np.testing.assert_allclose(spectra, np.tile(1 + inc, (10, 1)), rtol=1e-5)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mm = np.memmap(pathlib.Path(tmp_dir) / 'lts.dat', dtype=np.float32, mode='w+',
+                           shape=(10, len(frequencies)))
+            mm[:] = 2.0
+            self.hydrophone.apply_freq_cal(mm, frequencies, db=False)
+            np.testing.assert_allclose(mm[3], 2.0 * 10 ** (inc / 10), rtol=1e-5)
+            del mm
+
+        with self.assertRaises(ValueError):
+            self.hydrophone.apply_freq_cal(spectra, frequencies[1:])
+
+    def test_freq_cal_filter(self):
+        signal, fs = sf.read(test_file, frames=20000)
+        gain_upa = 10 ** (self.hydrophone.end_to_end_calibration() / 20.0)
+        fir = self.hydrophone.freq_cal_filter(fs)
+        assert self.hydrophone.freq_cal_filter(fs).taps is fir.taps
+
+        # Streaming by blocks gives the same result than filtering all at once
+        filtered = np.concatenate([fir.process(signal[i:i + 3000]) for i in np.arange(0, len(signal), 3000)])
+        np.testing.assert_allclose(filtered, np.convolve(signal, fir.taps)[:len(signal)], atol=1e-12)
+
+        blocks = [block.copy() for block in self.hydrophone.read_calibrated_blocks(test_file, blocksize=3000,
+                                                                                   stop=20000, freq_cal=True)]
+        expected = np.convolve(signal * gain_upa, fir.taps)[fir.delay:fir.delay + len(signal)]
+        np.testing.assert_allclose(np.concatenate(blocks), expected, rtol=1e-9, atol=1e-6)
+
+    def test_freq_cal_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.hydrophone.get_freq_cal(cache_dir=cache_dir)
+            assert len(list(pathlib.Path(cache_dir).glob('freq_cal_*.npz'))) == 1
+            cached = pyhy.RTSys(name='RTSys', model='RESEA320', serial_number=2003001, sensitivity=-180,
+                                preamp_gain=0, Vpp=5, mode='lowpower', calibration_file=calibration_file)
+            cached.get_freq_cal(cache_dir=cache_dir)
+            assert len(list(pathlib.Path(cache_dir).glob('freq_cal_*.npz'))) == 1
+            assert cached.freq_cal.equals(self.hydrophone.freq_cal)
+
+            # Different parser arguments are cached separately
+            cached.get_freq_cal(cache_dir=cache_dir, start_data_id=2)
+            assert len(list(pathlib.Path(cache_dir).glob('freq_cal_*.npz'))) == 2
+            assert len(cached.freq_cal) == len(self.hydrophone.freq_cal) - 2
+
+    def test_calibrate_by_blocks(self):
+        fs = 8000
+        signal = np.random.default_rng(0).normal(0, 0.001, fs * 20)
+        signal[fs * 5:fs * 15] += 0.5 * np.sin(2 * np.pi * 250 * np.arange(fs * 10) / fs)
+        upam_full = pyhy.uPam(name='Seiche', model='uPam', serial_number=1, sensitivity=-196.0, preamp_gain=0.0, Vpp=20)
+        upam_tone = pyhy.uPam(name='Seiche', model='uPam', serial_number=1, sensitivity=-196.0, preamp_gain=0.0, Vpp=20)
+        upam_full.update_calibration(signal[fs * 5:fs * 15])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cal_file = pathlib.Path(tmp_dir) / 'calibration.wav'
+            sf.write(cal_file, signal, fs, subtype='FLOAT')
+            end = upam_tone.calibrate(cal_file, detect_tone=True)
+            assert end == fs * 15
+            self.assertAlmostEqual(upam_tone.preamp_gain, upam_full.preamp_gain, places=6)
+
+            upam_tone.preamp_gain = 0.0
+            upam_tone.calibrate(cal_file, start=5, end=15, blocksize=1000)
+            self.assertAlmostEqual(upam_tone.preamp_gain, upam_full.preamp_gain, places=6)
+
+    def test_get_name_datetimes(self):
+        hydrophones_names = [
+            (pyhy.SoundTrap(name='SoundTrap', model=1, serial_number=67416073, sensitivity=-172.8),
+             ['67416073.210610033655.wav', '/data/67416073.990610033655.log.xml']),
+            (self.hydrophone, ['channelA_2021-10-11_13-11-09.wav']),
+            (pyhy.EARs(name='EARs', model=0, serial_number=0, sensitivity=-180, preamp_gain=0, Vpp=2),
+             ['EARs_20200101_120000.wav']),
+            (pyhy.uPam(name='Seiche', model='uPam', serial_number=1, sensitivity=-196, preamp_gain=0, Vpp=20),
+             ['Seiche_20200101_120000_123.wav', 'Seiche_20200101_120000_123456.wav']),
+            (pyhy.MTE(name='Aural', model='M2', serial_number=0, sensitivity=-164, preamp_gain=16, Vpp=2),
+             ['MTE_200101_120000.wav']),
+            (pyhy.uAural(name='uAural', model='RX', serial_number=1, sensitivity=-180, preamp_gain=12, Vpp=2),
+             ['120000_20200101_x.wav']),
+            (pyhy.BruelKjaer(name='B&K', model='Nexus', serial_number=1, preamp_gain=-170),
+             ['200101120000_ref.wav']),
+            (pyhy.AmarG3(name='AmarG3', model=1, serial_number=1, sensitivity=-199, preamp_gain=1, Vpp=2),
+             ['AMAR173.4.20200101T120000Z.wav']),
+        ]
+        for hydrophone, file_names in hydrophones_names:
+            dates = hydrophone.get_name_datetimes(file_names)
+            assert dates.dtype == np.dtype('datetime64[ns]')
+            for file_name, date in zip(file_names, dates):
+                assert date == np.datetime64(hydrophone.get_name_datetime(pathlib.Path(file_name).name))
+
+        assert np.isnat(self.hydrophone.get_name_datetimes(['not_a_date.wav'])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,17 @@ import pathlib
 import pyhydrophone as pyhy
 import unittest
 import numpy as np
+import pandas as pd
+import tempfile
+import zipfile
+from unittest import mock
+from pyhydrophone.archive import default_archive_cache
 
 CURRENT_DIR = pathlib.Path(__file__).parent
 
 test_folder = CURRENT_DIR / "test_data" / "rtsys"
 test_file = test_folder / "channelA_2021-10-11_13-11-09.wav"
+board_file = test_folder / "board_2021-10-11_13-11-09.txt"
 
 rtsys_name = 'RTSys'
 rtsys_model = 'RESEA320'
@@ -35,6 +41,42 @@ class TestRTSys(unittest.TestCase):
             header = self.rtsys.read_header(file_path)
             print(header)
 
+    def test_read_headers(self):
+        header = self.rtsys.read_header(test_file)
+        assert header['active_channels'] == 'A\x00\x00\x00'
+        headers = self.rtsys.read_headers([test_file, test_file])
+        assert len(headers) == 2
+        for name, value in header.items():
+            assert headers[name].iloc[1] == value
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zip_path = pathlib.Path(tmp_dir).joinpath('mission.zip')
+            with zipfile.ZipFile(zip_path, 'w') as zip_file:
+                zip_file.write(test_file, 'day1/' + test_file.name)
+                zip_file.write(test_file, 'day2/' + test_file.name)
+            zip_files = [zip_path.joinpath('day1', test_file.name), zip_path.joinpath('day2', test_file.name),
+                         zip_path.joinpath('day3', test_file.name)]
+            default_archive_cache.close()
+            with mock.patch('zipfile.ZipFile', wraps=zipfile.ZipFile) as zip_file_mock:
+                assert self.rtsys.read_header(zip_files[0], zip_mode=True) == header
+                zip_headers = self.rtsys.read_headers(zip_files, zip_mode=True)
+                self.rtsys.update_metadata(zip_files[1], zip_mode=True)
+            # The zip is only opened once
+            assert zip_file_mock.call_count == 1
+            default_archive_cache.close()
+            assert list(zip_headers['file_path']) == zip_files[:2]
+            assert (zip_headers.drop(columns='file_path') == headers.drop(columns='file_path')).all().all()
+
+    def test_board(self):
+        board_info = self.rtsys._parse_board_file(board_file)
+        assert len(board_info) == 33
+        for col in ['T', 'V', 'I', 'P']:
+            assert board_info[col].dtype == np.float32
+        assert board_info['V'].iloc[0] == np.float32(23.344)
+        first_timestamp = board_info['timestamp'].iloc[0]
+        assert abs(first_timestamp - pd.Timestamp('2021-10-11 13:11:10.378542')) < pd.Timedelta('10us')
+        np.testing.assert_allclose(self.rtsys.compute_consumption(board_file), 0.0409203, rtol=1e-5)
+
     def test_calibration(self):
         self.rtsys.calibrate(test_file)
 
@@ -1,10 +1,19 @@
 import pyhydrophone as pyhy
 import unittest
 import pathlib
+import shutil
+import tempfile
+import datetime
+import numpy as np
+import pandas as pd
+import soundfile as sf
+import importlib.util
+import zipfile
+from unittest import mock
 
 
 # Sound Files
-test_files = pathlib.Path('./test_data/soundtrap')
+test_files = pathlib.Path(__file__).parent / "test_data" / "soundtrap"
 
 # Output path for the detected clicks
 clicks_output_path = 'clicks.pkl'
@@ -20,6 +29,26 @@ serial_number4 = 9135
 channel4 = 'A'
 sensitivity4 = -180
 
+click_len = 172
+hf_fs = 576000
+
+
+def write_hf_folder(folder_path):
+    """
+    Copy the soundtrap test data to folder_path and add the .wav and .dwv files, with as many snippets of click_len as
+    in the .log.xml. All the samples of the snippet i have the value i (in int16)
+    """
+    for bcl_path in test_files.glob('*.bcl'):
+        for suffix in ['.bcl', '.log.xml', '.accel.csv', '.temp.csv']:
+            shutil.copy(bcl_path.with_name(bcl_path.name.replace('.bcl', suffix)), folder_path)
+        n_clicks = int(bcl_path.with_name(bcl_path.name.replace('.bcl', '.log.xml')).read_text().split(
+            'SampleCount="')[-1].split('"')[0]) // click_len
+        waves = np.repeat(np.arange(n_clicks, dtype=np.int16), click_len)
+        sf.write(folder_path.joinpath(bcl_path.name.replace('.bcl', '.dwv')), waves, hf_fs, format='WAV',
+                 subtype='PCM_16')
+        sf.write(folder_path.joinpath(bcl_path.name.replace('.bcl', '.wav')), np.zeros(10, dtype=np.int16), 96000,
+                 subtype='PCM_16')
+
 
 class TestSoundTrap(unittest.TestCase):
     def test_hf(self):
@@ -31,6 +60,245 @@ class TestSoundTrap(unittest.TestCase):
 
         return clicks_df
 
+    def test_hf_waves_matrix(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            wav_path = folder_path.joinpath('67416073.210610034155.wav')
+            clicks, waves = hydrophone.read_HFclicks_file(wav_path, waves_dtype='int16')
+            assert waves.dtype == np.int16
+            assert waves.shape == (len(clicks), click_len)
+            assert waves.flags.c_contiguous
+            assert 'wave' not in clicks.columns
+            np.testing.assert_array_equal(waves[clicks['wave_idx'], 0], np.arange(len(clicks)))
+
+            clicks_wave = hydrophone.read_HFclicks_file(wav_path)
+            assert len(clicks_wave) == len(clicks)
+            np.testing.assert_allclose(clicks_wave['wave'].iloc[10], waves[10] / 2 ** 15)
+
+    def test_hf_folder(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            files_clicks = list(hydrophone.iter_HFfolder(folder_path, waves_dtype='float32'))
+            assert len(files_clicks) == 3
+            clicks, waves = hydrophone.read_HFfolder(folder_path, waves_dtype='float32')
+            assert len(clicks) == len(waves) == sum(len(file_clicks) for file_clicks, _ in files_clicks)
+            assert clicks.index.is_unique
+            np.testing.assert_array_equal(waves[clicks['wave_idx']], waves)
+            # The index of the clicks of the second file point to the second part of the waves
+            second_file = clicks['filename'] == str(folder_path.joinpath('67416073.210610034155.dwv'))
+            np.testing.assert_allclose(waves[clicks.loc[second_file, 'wave_idx'], 0] * 2 ** 15,
+                                       np.arange(second_file.sum()))
+
+            clicks_wave = hydrophone.read_HFfolder(folder_path)
+            assert len(clicks_wave) == len(clicks)
+
+            clicks_parallel, waves_parallel = hydrophone.read_HFfolder(folder_path, waves_dtype='float32', n_workers=2)
+            pd.testing.assert_frame_equal(clicks_parallel, clicks)
+            np.testing.assert_array_equal(waves_parallel, waves)
+            clicks_wave_parallel = hydrophone.read_HFfolder(folder_path, n_workers=2)
+            assert list(clicks_wave_parallel.columns) == list(clicks_wave.columns)
+            np.testing.assert_array_equal(np.stack(clicks_wave_parallel['wave']), np.stack(clicks_wave['wave']))
+
+    def test_hf_broken_file(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            clicks, waves = hydrophone.read_HFfolder(folder_path, waves_dtype='float32')
+            # An empty .bcl file can not be parsed, the clicks of the other files are still read
+            broken_file = folder_path.joinpath('67416073.210610034155.bcl')
+            broken_file.write_text('')
+            broken_clicks = clicks['filename'] == str(broken_file.with_suffix('.dwv'))
+            clicks_left, waves_left = hydrophone.read_HFfolder(folder_path, waves_dtype='float32')
+            assert len(clicks_left) == len(waves_left) == (~broken_clicks).sum()
+
+    def test_hf_metadata_only(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            clicks, waves = hydrophone.read_HFfolder(folder_path, waves_dtype='float32')
+            # Remove the dwv files to make sure they are not opened
+            for dwv_path in folder_path.glob('*.dwv'):
+                dwv_path.rename(dwv_path.with_suffix('.bak'))
+            clicks_info = hydrophone.read_HFfolder(folder_path, load_waves=False)
+            assert 'wave' not in clicks_info.columns
+            pd.testing.assert_frame_equal(clicks_info, clicks.drop(columns='wave_idx'))
+            assert (clicks_info['fs'] == hf_fs).all()
+            for dwv_path in folder_path.glob('*.bak'):
+                dwv_path.rename(dwv_path.with_suffix('.dwv'))
+
+            # Lazy loading of some of the clicks, not sorted
+            selected = clicks_info.sample(n=50, random_state=0)
+            selected_waves = hydrophone.read_HFwaves(selected, dtype='float32')
+            np.testing.assert_array_equal(selected_waves, waves[selected.index])
+
+    def test_hf_filters(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            wav_path = folder_path.joinpath('67416073.210610034155.wav')
+            clicks, waves = hydrophone.read_HFclicks_file(wav_path, waves_dtype='int16')
+            start = clicks['datetime'].iloc[100]
+            end = clicks['datetime'].iloc[2000]
+            query = 'nl > %s' % clicks['nl'].median()
+            expected = clicks.loc[(clicks['datetime'] >= start) & (clicks['datetime'] < end)].query(query)
+
+            selected, selected_waves = hydrophone.read_HFclicks_file(wav_path, waves_dtype='int16', start=start,
+                                                                     end=end, query=query)
+            assert 0 < len(selected) < len(clicks)
+            pd.testing.assert_frame_equal(selected.drop(columns='wave_idx'),
+                                          expected.drop(columns='wave_idx').reset_index(drop=True))
+            np.testing.assert_array_equal(selected_waves, waves[expected['wave_idx']])
+
+            selected_info = hydrophone.read_HFclicks_file(wav_path, load_waves=False, start=start, end=end,
+                                                          query=lambda df: df['nl'] > clicks['nl'].median())
+            pd.testing.assert_frame_equal(selected_info, selected.drop(columns='wave_idx'))
+
+    @unittest.skipIf(importlib.util.find_spec('pyarrow') is None and importlib.util.find_spec('fastparquet') is None,
+                     'Writing parquet files needs pyarrow or fastparquet')
+    def test_hf_save_load(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            clicks, waves = hydrophone.read_HFfolder(folder_path, waves_dtype='int16')
+            hydrophone.save_HFclicks(folder_path.joinpath('export'), clicks, waves)
+            loaded_clicks, loaded_waves = hydrophone.load_HFclicks(folder_path.joinpath('export'))
+            assert isinstance(loaded_waves, np.memmap)
+            pd.testing.assert_frame_equal(loaded_clicks, clicks, check_dtype=False)
+            np.testing.assert_array_equal(loaded_waves, waves)
+
+            clicks_wave = hydrophone.read_HFfolder(folder_path)
+            hydrophone.save_HFclicks(folder_path.joinpath('export_wave'), clicks_wave)
+            loaded_clicks, loaded_waves = hydrophone.load_HFclicks(folder_path.joinpath('export_wave'))
+            np.testing.assert_array_equal(loaded_waves[loaded_clicks['wave_idx']], np.stack(clicks_wave['wave']))
+            del loaded_waves
+
+    def test_hf_zip(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir).joinpath('folder')
+            folder_path.mkdir()
+            write_hf_folder(folder_path)
+            zip_path = pathlib.Path(tmp_dir).joinpath('deployment.zip')
+            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                for file_path in sorted(folder_path.iterdir()):
+                    zip_file.write(file_path, file_path.name)
+            clicks, waves = hydrophone.read_HFfolder(folder_path, waves_dtype='float32')
+
+            with mock.patch('zipfile.ZipFile', wraps=zipfile.ZipFile) as zip_file_mock:
+                zip_clicks, zip_waves = hydrophone.read_HFfolder(zip_path, zip_mode=True, waves_dtype='float32',
+                                                                 zip_threads=2)
+            # The zip is opened once, to list the files and to read them
+            assert zip_file_mock.call_count == 1
+            assert zip_clicks['filename'].iloc[0] == str(zip_path.joinpath('67416073.210610033655.dwv'))
+            pd.testing.assert_frame_equal(zip_clicks.drop(columns='filename'), clicks.drop(columns='filename'))
+            np.testing.assert_array_equal(zip_waves, waves)
+
+    def test_click_features(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        # Gaussian pulses at different frequencies and amplitudes
+        t = (np.arange(click_len) - click_len // 2) / hf_fs
+        freqs = np.array([100e3, 130e3, 150e3])
+        amplitudes = np.array([0.5, 0.1, 0.02])
+        waves = amplitudes[:, np.newaxis] * np.cos(2 * np.pi * freqs[:, np.newaxis] * t) * np.exp(-(t / 20e-6) ** 2)
+        clicks = pd.DataFrame({'wave_idx': [2, 0, 1], 'fs': hf_fs})
+
+        features = hydrophone.compute_click_features(clicks, waves, batch_size=2)
+        resolution = hf_fs / click_len
+        np.testing.assert_allclose(features['peak_freq'], freqs[[2, 0, 1]], atol=resolution)
+        np.testing.assert_allclose(features['centroid_freq'], freqs[[2, 0, 1]], atol=resolution)
+        # Bandwidth of a gaussian pulse: sqrt(2 ln(2)) / (pi * sigma)
+        np.testing.assert_allclose(features['bandwidth_3db'], np.sqrt(2 * np.log(2)) / (np.pi * 20e-6),
+                                   atol=2 * resolution)
+        assert (features['energy_duration'] < 50e-6).all()
+        rl_pp = 20 * np.log10(np.ptp(waves[[2, 0, 1]], axis=1)) + hydrophone.end_to_end_calibration()
+        np.testing.assert_allclose(features['rl_pp'], rl_pp)
+
+        # Silent snippets have no features
+        silent_clicks = pd.DataFrame({'wave_idx': [0, 1], 'fs': hf_fs})
+        silent_waves = np.vstack([waves[0], np.zeros(click_len)])
+        silent_features = hydrophone.compute_click_features(silent_clicks, silent_waves)
+        for feature in ['peak_freq', 'centroid_freq', 'bandwidth_3db', 'energy_duration']:
+            assert not np.isnan(silent_features[feature].iloc[0])
+            assert np.isnan(silent_features[feature].iloc[1])
+
+        clicks_wave = pd.DataFrame({'wave': list(waves[[2, 0, 1]]), 'fs': hf_fs})
+        features_wave = hydrophone.compute_click_features(clicks_wave)
+        pd.testing.assert_frame_equal(features_wave.drop(columns='wave'), features.drop(columns='wave_idx'))
+
+    def test_log_xml(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder_path = pathlib.Path(tmp_dir)
+            write_hf_folder(folder_path)
+            log_path = folder_path.joinpath('67416073.210610034155.log.xml')
+
+            # Only the fields needed are parsed, and the result is cached
+            log = hydrophone.read_log_xml(log_path, fields=['predet', 'postdet'])
+            assert log['predet'] + log['postdet'] == click_len
+            assert 'complete' not in log
+            assert hydrophone.read_HFparams(log_path) == click_len
+            assert hydrophone.read_log_xml(log_path, fields=['predet']) is log
+            full_log = hydrophone.read_log_xml(log_path)
+            assert full_log['complete']
+            assert hydrophone.read_log_xml(log_path) is full_log
+            assert hydrophone.read_HFdwv_params(log_path)[1:] == (hf_fs, 23626 * click_len)
+            assert hydrophone.get_xml_utc_datetime(log_path.with_name('67416073.210610034155.wav')) == \
+                datetime.datetime(2021, 6, 10, 3, 41, 54)
+
+            specs = hydrophone.read_file_specs(log_path, last_gain='High')
+            assert specs['type_start'] == 'REOPEN'
+            assert specs['start_time'] == datetime.datetime(2021, 6, 10, 5, 41, 55)
+
+            logs = hydrophone.read_log_folder(folder_path)
+            assert len(logs) == 3
+            assert (logs['wav_fs'] == 96000).all()
+            assert logs['start_utc'].is_monotonic_increasing
+            metadata = hydrophone.read_file_metadata(log_path.with_name('67416073.210610034155.wav'))
+            assert metadata['start_utc'] == logs['start_utc'].iloc[1]
+
+            # Modified files are parsed again
+            log_text = log_path.read_text()
+            log_path.write_text(log_text.replace('<PREDET UNIT="samples"> 57', '<PREDET UNIT="samples"> 58'))
+            assert hydrophone.read_HFparams(log_path) == click_len + 1
+
+    def test_sensor_files(self):
+        hydrophone = pyhy.SoundTrapHF(name=name, model=model, serial_number=serial_number, sensitivity=-172.8)
+        accel = hydrophone.read_sensor_folder(test_files, sensor='accel')
+        assert list(accel.columns) == ['datetime', 'unix_time', 'x', 'y', 'z']
+        assert accel['x'].dtype == np.int32
+        assert len(accel) == 3 * 15
+        assert accel['datetime'].iloc[0] == pd.Timestamp('2021-06-10 03:37:15')
+        pd.testing.assert_frame_equal(hydrophone.read_sensor_folder(test_files, sensor='accel', chunksize=4), accel)
+
+        temp = hydrophone.read_sensor_folder(test_files, sensor='temp')
+        assert len(temp) == 3 * 15
+        np.testing.assert_allclose(temp['temperature'], 11.8, atol=0.5)
+
+        windows = pd.DataFrame({'datetime': pd.to_datetime(['2021-06-10 03:50:00', '2021-06-10 03:40:00',
+                                                            '2021-06-10 03:00:00'])})
+        aligned = hydrophone.align_sensor_data(windows, accel, tolerance='1min')
+        assert (aligned['datetime'] == windows['datetime']).all()
+        expected = accel.loc[accel['datetime'] <= windows['datetime'].iloc[0], 'x'].iloc[-1]
+        assert aligned['x'].iloc[0] == expected
+        assert np.isnan(aligned['x'].iloc[2])
+
+        # Windows of several files concatenated keep their duplicated index, and windows without datetime are kept
+        windows_files = pd.concat([windows, windows.iloc[:2], pd.DataFrame({'datetime': [pd.NaT]})])
+        aligned_files = hydrophone.align_sensor_data(windows_files, accel, tolerance='1min')
+        assert len(aligned_files) == len(windows_files)
+        assert (aligned_files.index == windows_files.index).all()
+        pd.testing.assert_series_equal(aligned_files['x'].iloc[:3], aligned['x'])
+        assert aligned_files['x'].iloc[3] == aligned['x'].iloc[0]
+        assert np.isnan(aligned_files['x'].iloc[5])
+
     def test_init_multiple_serial_numbers(self):
         try:
             pyhy.SoundTrapHF(name=name, model=model2, serial_number=6042, gain_type='High')
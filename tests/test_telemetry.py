@@ -0,0 +1,116 @@
+import pathlib
+import pyhydrophone as pyhy
+import unittest
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.pyplot as plt
+
+board_file = pathlib.Path(__file__).parent / "test_data" / "rtsys" / "board_2021-10-11_13-11-09.txt"
+
+
+def write_mission(mission_folder_path, n_days=3):
+    """
+    Write a mission with one folder per day with a board file, each one shifted one day
+    """
+    lines = board_file.read_text().splitlines()
+    for day in range(n_days):
+        day_folder = mission_folder_path.joinpath('day%s' % day)
+        day_folder.mkdir()
+        shifted = []
+        for line in lines:
+            epoch, values = line[2:].split(';', 1)
+            shifted.append('@:%019.6f;%s' % (float(epoch) + day * 86400, values))
+        day_folder.joinpath('board_day%s.txt' % day).write_text('\n'.join(shifted) + '\n')
+        day_folder.joinpath('notes.txt').write_text('not a board file')
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.mission_path = pathlib.Path(self.tmp_dir.name).joinpath('mission')
+        self.mission_path.mkdir()
+        self.cache_dir = pathlib.Path(self.tmp_dir.name).joinpath('cache')
+        write_mission(self.mission_path)
+        self.rtsys = pyhy.RTSys(name='RTSys', model='RESEA320', serial_number=2003001, sensitivity=-180,
+                                preamp_gain=0, Vpp=5, mode='lowpower')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_refresh(self):
+        file_consumption = self.rtsys.compute_consumption(board_file)
+        with pyhy.MissionTelemetry(self.rtsys, self.mission_path, cache_dir=self.cache_dir, max_workers=2) as telemetry:
+            assert telemetry.refresh() == 3
+            assert telemetry.refresh() == 0
+            assert len(telemetry) == 3
+            np.testing.assert_allclose(telemetry.total_consumption(), 3 * file_consumption, rtol=1e-4)
+            files = telemetry.files()
+            assert files['start'].is_monotonic_increasing
+            df = telemetry.to_dataframe()
+            assert len(df) == 3 * 33
+            assert df['timestamp'].is_monotonic_increasing
+            assert df['V'].dtype == np.float32
+
+        # The cache is kept on disk and only the modified files are parsed again
+        self.mission_path.joinpath('day1', 'board_day1.txt').write_text(board_file.read_text())
+        self.mission_path.joinpath('day2', 'board_day2.txt').unlink()
+        with pyhy.MissionTelemetry(self.rtsys, self.mission_path, cache_dir=self.cache_dir) as telemetry:
+            assert telemetry.refresh() == 1
+            assert len(telemetry) == 2
+            assert len(list(self.cache_dir.glob('*.npz'))) == 2
+            assert len(telemetry.to_dataframe()) == 2 * 33
+
+    def test_decimate(self):
+        with pyhy.MissionTelemetry(self.rtsys, self.mission_path) as telemetry:
+            telemetry.refresh()
+            df = telemetry.to_dataframe()
+            decimated = telemetry.decimate(['V', 'P'], max_points=20)
+            assert len(decimated) <= 20
+            assert decimated['timestamp'].is_monotonic_increasing
+            for col in ['V', 'P']:
+                assert decimated[col].min() == df[col].min()
+                assert decimated[col].max() == df[col].max()
+            # With more bins than points, all the values are kept
+            decimated = telemetry.decimate(['P'], max_points=10 * 86400 * 3)
+            np.testing.assert_array_equal(np.sort(decimated['P'].to_numpy()), np.sort(np.repeat(df['P'], 2)))
+
+    def test_plot_decimated(self):
+        matplotlib.use('Agg')
+        fig, ax = plt.subplots()
+        self.rtsys.plot_consumption_total_mission(self.mission_path, ax=ax, show=False, max_points=20)
+        assert len(ax.lines[0].get_xdata()) <= 20
+        plt.close(fig)
+
+    def test_totals_only(self):
+        with pyhy.MissionTelemetry(self.rtsys, self.mission_path, cache_dir=self.cache_dir,
+                                   keep_series=False) as telemetry:
+            assert telemetry.refresh() == 3
+            totals = telemetry.files()
+            assert len(telemetry._series) == 0
+            assert len(list(self.cache_dir.glob('*.npz'))) == 0
+            with self.assertRaises(ValueError):
+                telemetry.to_dataframe()
+        # The files without series are parsed again when the series are needed
+        with pyhy.MissionTelemetry(self.rtsys, self.mission_path, cache_dir=self.cache_dir) as telemetry:
+            assert telemetry.refresh() == 3
+            assert len(telemetry.to_dataframe()) == totals['n_rows'].sum()
+            pd.testing.assert_frame_equal(telemetry.files(), totals)
+
+        with mock.patch.object(pyhy.MissionTelemetry, '_save_series') as save_series:
+            self.rtsys.compute_consumption_total_mission(self.mission_path)
+        save_series.assert_not_called()
+
+    def test_total_mission(self):
+        total = self.rtsys.compute_consumption_total_mission(self.mission_path)
+        expected = sum(self.rtsys.compute_consumption(board_path)
+                       for board_path in self.mission_path.glob('**/board*.txt'))
+        np.testing.assert_allclose(total, expected)
+        assert self.rtsys.compute_consumption_total_mission(self.mission_path, cache_dir=self.cache_dir) == \
+            self.rtsys.compute_consumption_total_mission(self.mission_path, cache_dir=self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()